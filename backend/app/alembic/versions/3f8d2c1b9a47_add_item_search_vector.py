@@ -0,0 +1,56 @@
+"""Add item search vector
+
+Revision ID: 3f8d2c1b9a47
+Revises: e2412789c190
+Create Date: 2026-10-18 10:12:31.482917
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "3f8d2c1b9a47"
+down_revision = "e2412789c190"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Adding a STORED generated column rewrites the whole table under an
+    # ACCESS EXCLUSIVE lock, reads and writes of item wait until it's done.
+    # On a large table, run it in a maintenance window
+    op.add_column(
+        "item",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('simple'::regconfig, "
+                "title || ' ' || coalesce(description, ''))",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    # CONCURRENTLY doesn't lock writes to item but can't run in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_item_search_vector",
+            "item",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_item_search_vector",
+            table_name="item",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("item", "search_vector")
@@ -0,0 +1,30 @@
+"""Add row versions
+
+Revision ID: 6c9594dcef3f
+Revises: b0aa61b8d4cd
+Create Date: 2026-10-18 10:37:18.794220
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6c9594dcef3f"
+down_revision = "b0aa61b8d4cd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant default doesn't rewrite the tables on Postgres 11 and later
+    op.add_column(
+        "item", sa.Column("version", sa.Integer(), server_default="1", nullable=False)
+    )
+    op.add_column(
+        "user", sa.Column("version", sa.Integer(), server_default="1", nullable=False)
+    )
+
+
+def downgrade():
+    op.drop_column("user", "version")
+    op.drop_column("item", "version")
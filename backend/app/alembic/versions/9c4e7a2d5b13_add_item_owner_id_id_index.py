@@ -0,0 +1,35 @@
+"""Add item owner_id, id index
+
+Revision ID: 9c4e7a2d5b13
+Revises: 3f8d2c1b9a47
+Create Date: 2026-10-18 10:41:07.215306
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9c4e7a2d5b13"
+down_revision = "3f8d2c1b9a47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY doesn't lock writes to item but can't run in a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_item_owner_id_id",
+            "item",
+            ["owner_id", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_item_owner_id_id",
+            table_name="item",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,34 @@
+"""Add user deletion
+
+Revision ID: b0aa61b8d4cd
+Revises: 9c4e7a2d5b13
+Create Date: 2026-10-18 10:22:44.880418
+
+"""
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b0aa61b8d4cd"
+down_revision = "9c4e7a2d5b13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "userdeletion",
+        sa.Column("status", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("items_total", sa.Integer(), nullable=True),
+        sa.Column("items_deleted", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("userdeletion")
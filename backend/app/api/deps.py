@@ -1,16 +1,20 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import async_engine, engine
+from app.core.replicas import LAST_WRITE_COOKIE, get_last_write, replica_router
 from app.model.users import TokenPayload, User
+from app.repository.users import get_user_cached
+from app.utils import decode_cursor
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -22,22 +26,76 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # Attributes are not expired on commit: lazy refreshes are not possible
+    # outside of an awaited call with the async session
+    writes = request.method not in ("GET", "HEAD", "OPTIONS")
+    if writes and replica_router.replicas:
+        # ReadYourWritesMiddleware sends the client the time of the write
+        request.state.wrote_to_primary = True
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+        # Skipped when the route failed
+        if writes:
+            replica_router.record_write(request.headers.get("Authorization"))
+
+
+def get_read_engine(request: Request) -> AsyncEngine:
+    """
+    Engine for read-only routes, a read replica when one is configured and up
+    to date. A client reads from the primary for a while after its own
+    writes, see app/core/replicas.py.
+    """
+    return replica_router.get_engine(
+        request.headers.get("Authorization"),
+        get_last_write(request.cookies.get(LAST_WRITE_COOKIE)),
+    )
+
+
+ReadEngineDep = Annotated[AsyncEngine, Depends(get_read_engine)]
+
+
+async def get_read_db(read_engine: ReadEngineDep) -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(read_engine, expire_on_commit=False) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
+IfNoneMatch = Annotated[str | None, Header()]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def get_cursor_id(cursor: str | None = None) -> int | None:
+    if cursor is None:
+        return None
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
+        (last_id,) = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+CursorIdDep = Annotated[int | None, Depends(get_cursor_id)]
+
+
+async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> User:
+    payload = security.decode_access_token(token)
+    try:
+        if payload is None:
+            raise ValueError("Invalid token")
         token_data = TokenPayload(**payload)
-    except (JWTError, ValidationError):
+    except (ValueError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    user = None
+    if token_data.sub is not None:
+        user = await get_user_cached(session=session, user_id=token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -48,7 +106,7 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+async def get_current_active_superuser(current_user: CurrentUser) -> User:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
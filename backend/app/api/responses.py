@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    JSON response rendered by orjson, for routes that return large models.
+
+    FastAPI validates whatever a route returns against its response_model
+    again and encodes it through jsonable_encoder, unless the route returns a
+    Response itself. Routes opt in by building their response model once and
+    returning it wrapped in this class. Declare it as the response_class too,
+    the response_model then only documents the schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            content = content.model_dump()
+        return orjson.dumps(content)
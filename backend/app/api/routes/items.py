@@ -1,102 +1,338 @@
-from typing import Any
+import csv
+import io
+from collections.abc import AsyncIterator
+from typing import Annotated, Any, Literal, NoReturn
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Float, and_, cast, or_
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.api.deps import CurrentUser, SessionDep
-from app.model.users import Item, ItemCreate, ItemOut, ItemsOut, ItemUpdate, Message
+from app.api.deps import (
+    AsyncSessionDep,
+    CurrentUser,
+    CursorIdDep,
+    IfNoneMatch,
+    ReadEngineDep,
+    ReadSessionDep,
+)
+from app.api.responses import FastJSONResponse
+from app.core.config import settings
+from app.model.users import (
+    ITEM_SEARCH_CONFIG,
+    Item,
+    ItemCreate,
+    ItemOut,
+    ItemsOut,
+    ItemUpdate,
+    Message,
+    item_search_vector,
+)
+from app.repository import users
+from app.repository.counts import CountMode, count_items
+from app.repository.item_cache import (
+    cache_first_page,
+    cache_item,
+    get_cached_first_page,
+    get_cached_item,
+    invalidate_cached_items,
+)
+from app.utils import decode_cursor, encode_cursor, etag_matches, make_etag
 
 router = APIRouter()
 
+NOT_MODIFIED: dict[int | str, dict[str, Any]] = {304: {"description": "Not Modified"}}
+# Default page size, the first page of this size is cached
+ITEMS_PAGE_SIZE = 100
 
-@router.get("/", response_model=ItemsOut)
-def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+
+@router.get(
+    "/",
+    response_model=ItemsOut,
+    response_class=FastJSONResponse,
+    responses=NOT_MODIFIED,
+)
+async def read_items(
+    session: ReadSessionDep,
+    current_user: CurrentUser,
+    after_id: CursorIdDep,
+    skip: int = 0,
+    limit: int = ITEMS_PAGE_SIZE,
+    count_mode: Annotated[CountMode, Query(alias="count")] = "exact",
+    if_none_match: IfNoneMatch = None,
 ) -> Any:
     """
     Retrieve items.
+
+    Pass the returned `next_cursor` as `cursor` to fetch the following page,
+    `skip` is ignored when a cursor is given. Use `count=none` to skip the
+    total, e.g. when paging forward, or `count=estimate` for a fast
+    approximate total.
+
+    The response has an ETag, send it back as `If-None-Match` to get an
+    empty 304 response while the page is unchanged.
     """
 
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
+        owner_id = None
+        statement = select(Item)
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
+        owner_id = current_user.id
+        statement = select(Item).where(Item.owner_id == current_user.id)
+
+    first_page = (
+        after_id is None
+        and skip == 0
+        and limit == ITEMS_PAGE_SIZE
+        and count_mode == "exact"
+    )
+    if first_page and (cached := await get_cached_first_page(owner_id)):
+        etag = cached["etag"]
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return FastJSONResponse(cached["page"], headers={"ETag": etag})
+
+    count = await count_items(session=session, owner_id=owner_id, mode=count_mode)
+
+    statement = statement.order_by(col(Item.id))
+    if after_id is not None:
+        statement = statement.where(col(Item.id) > after_id)
+    else:
+        statement = statement.offset(skip)
+    # Fetch one extra row to know whether there is a next page
+    items = (await session.exec(statement.limit(limit + 1))).all()
+    next_cursor = None
+    if limit > 0 and len(items) > limit:
+        next_cursor = encode_cursor([items[limit - 1].id])
+    items = items[:limit]
+
+    etag = make_etag([count, next_cursor, [(item.id, item.version) for item in items]])
+    page = ItemsOut(data=items, count=count, next_cursor=next_cursor)
+    if first_page:
+        await cache_first_page(owner_id, page=page.model_dump(), etag=etag)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(page, headers={"ETag": etag})
+
+
+@router.get("/search", response_model=ItemsOut, response_class=FastJSONResponse)
+async def search_items(
+    session: ReadSessionDep,
+    current_user: CurrentUser,
+    q: Annotated[str, Query(min_length=1)],
+    cursor: str | None = None,
+    limit: int = 100,
+) -> Any:
+    """
+    Search items by title and description, best matches first.
+
+    Supports web search syntax, e.g. `"exact phrase" -excluded or other`.
+    Pass the returned `next_cursor` as `cursor` to fetch the following page.
+    """
+    query = func.websearch_to_tsquery(ITEM_SEARCH_CONFIG, q)
+    # Double precision so the rank survives the round trip through the cursor
+    rank = cast(func.ts_rank(item_search_vector, query), Float(precision=53))
+    statement = select(Item, rank).where(item_search_vector.op("@@")(query))
+    if not current_user.is_superuser:
+        statement = statement.where(Item.owner_id == current_user.id)
+    if cursor is not None:
+        try:
+            last_rank, last_id = decode_cursor(cursor)
+            last_rank, last_id = float(last_rank), int(last_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        statement = statement.where(
+            or_(rank < last_rank, and_(rank == last_rank, col(Item.id) > last_id))
         )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
+    statement = statement.order_by(rank.desc(), col(Item.id)).limit(limit + 1)
+    rows = (await session.exec(statement)).all()
+    next_cursor = None
+    if limit > 0 and len(rows) > limit:
+        last_item, last_rank = rows[limit - 1]
+        next_cursor = encode_cursor([last_rank, last_item.id])
+    rows = rows[:limit]
+
+    return FastJSONResponse(
+        ItemsOut(data=[item for item, _ in rows], count=None, next_cursor=next_cursor)
+    )
+
+
+async def _stream_items(
+    read_engine: AsyncEngine,
+    statement: SelectOfScalar[Item],
+    format: Literal["ndjson", "csv"],
+) -> AsyncIterator[str]:
+    # Dependencies exit before a streaming body is sent, so the export uses
+    # its own session for the server-side cursor
+    async with AsyncSession(read_engine) as session:
+        result = await session.stream_scalars(
+            statement,
+            execution_options={"yield_per": settings.ITEMS_EXPORT_BATCH_SIZE},
         )
-        items = session.exec(statement).all()
+        fields = list(ItemOut.model_fields)
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields)
+            writer.writeheader()
+            yield buffer.getvalue()
+        async for items in result.partitions():
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=fields)
+                writer.writerows(item.model_dump(include=set(fields)) for item in items)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    ItemOut.model_validate(item).model_dump_json() + "\n"
+                    for item in items
+                )
+
 
-    return ItemsOut(data=items, count=count)
+@router.get("/export", response_class=StreamingResponse)
+async def export_items(
+    read_engine: ReadEngineDep,
+    current_user: CurrentUser,
+    format: Literal["ndjson", "csv"] = "ndjson",
+) -> Any:
+    """
+    Export all items as newline delimited JSON or CSV.
+    """
+    statement = select(Item).order_by(col(Item.id))
+    if not current_user.is_superuser:
+        statement = statement.where(Item.owner_id == current_user.id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_items(read_engine, statement, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="items.{format}"'},
+    )
 
 
-@router.get("/{id}", response_model=ItemOut)
-def read_item(session: SessionDep, current_user: CurrentUser, id: int) -> Any:
+@router.get(
+    "/{id}",
+    response_model=ItemOut,
+    response_class=FastJSONResponse,
+    responses=NOT_MODIFIED,
+)
+async def read_item(
+    session: ReadSessionDep,
+    current_user: CurrentUser,
+    id: int,
+    if_none_match: IfNoneMatch = None,
+) -> Any:
     """
     Get item by ID.
+
+    The response has an ETag, send it back as `If-None-Match` to get an
+    empty 304 response while the item is unchanged.
     """
-    item = session.get(Item, id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
+    cached = await get_cached_item(id)
+    if cached:
+        item, etag = cached["item"], cached["etag"]
+    else:
+        # Only the columns of the response are fetched, as a plain row rather
+        # than an ORM instance
+        statement = select(
+            Item.title, Item.description, Item.owner_id, Item.version
+        ).where(Item.id == id)
+        row = (await session.exec(statement)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Item not found")
+        title, description, owner_id, version = row
+        item = ItemOut(
+            id=id, title=title, description=description, owner_id=owner_id
+        ).model_dump()
+        etag = make_etag([id, version])
+        await cache_item(id, item=item, etag=etag)
+    if not current_user.is_superuser and (item["owner_id"] != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return item
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(item, headers={"ETag": etag})
 
 
 @router.post("/", response_model=ItemOut)
-def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+async def create_item(
+    *, session: AsyncSessionDep, current_user: CurrentUser, item_in: ItemCreate
 ) -> Any:
     """
     Create new item.
     """
-    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
-    session.add(item)
-    session.commit()
-    session.refresh(item)
+    assert current_user.id is not None
+    item = await users.create_item_async(
+        session=session, item_in=item_in, owner_id=current_user.id
+    )
+    await invalidate_cached_items(item.owner_id)
     return item
 
 
+@router.post("/bulk", response_model=list[ItemOut])
+async def create_items(
+    *, session: AsyncSessionDep, current_user: CurrentUser, items_in: list[ItemCreate]
+) -> Any:
+    """
+    Create many items at once.
+    """
+    if len(items_in) > settings.ITEMS_BULK_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items, the maximum is {settings.ITEMS_BULK_MAX_SIZE}",
+        )
+    assert current_user.id is not None
+    items = await users.create_items_async(
+        session=session, items_in=items_in, owner_id=current_user.id
+    )
+    await invalidate_cached_items(current_user.id)
+    return items
+
+
+async def _raise_item_not_found_or_forbidden(
+    session: AsyncSession, id: int
+) -> NoReturn:
+    # Writes check the owner in their WHERE clause, the item is only looked
+    # up when they didn't match to tell the two cases apart
+    exists = (await session.exec(select(Item.id).where(Item.id == id))).first()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    raise HTTPException(status_code=400, detail="Not enough permissions")
+
+
 @router.put("/{id}", response_model=ItemOut)
-def update_item(
-    *, session: SessionDep, current_user: CurrentUser, id: int, item_in: ItemUpdate
+async def update_item(
+    *,
+    session: AsyncSessionDep,
+    current_user: CurrentUser,
+    id: int,
+    item_in: ItemUpdate,
 ) -> Any:
     """
     Update an item.
     """
-    item = session.get(Item, id)
+    owner_id = None if current_user.is_superuser else current_user.id
+    item = await users.update_item_async(
+        session=session, item_id=id, item_in=item_in, owner_id=owner_id
+    )
     if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    update_dict = item_in.model_dump(exclude_unset=True)
-    item.sqlmodel_update(update_dict)
-    session.add(item)
-    session.commit()
-    session.refresh(item)
+        await _raise_item_not_found_or_forbidden(session, id)
+    await invalidate_cached_items(item.owner_id, [item.id])
     return item
 
 
 @router.delete("/{id}")
-def delete_item(session: SessionDep, current_user: CurrentUser, id: int) -> Message:
+async def delete_item(
+    session: AsyncSessionDep, current_user: CurrentUser, id: int
+) -> Message:
     """
     Delete an item.
     """
-    item = session.get(Item, id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
-    session.commit()
+    owner_id = None if current_user.is_superuser else current_user.id
+    deleted_owner_id = await users.delete_item_async(
+        session=session, item_id=id, owner_id=owner_id
+    )
+    if deleted_owner_id is None:
+        await _raise_item_not_found_or_forbidden(session, id)
+    await invalidate_cached_items(deleted_owner_id, [id])
     return Message(message="Item deleted successfully")
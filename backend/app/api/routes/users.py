@@ -1,70 +1,111 @@
-from typing import Any
+import csv
+import io
+from itertools import islice
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, select
 
 from app.api.deps import (
+    AsyncSessionDep,
     CurrentUser,
-    SessionDep,
+    CursorIdDep,
+    IfNoneMatch,
+    ReadSessionDep,
     get_current_active_superuser,
 )
+from app.api.responses import FastJSONResponse
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.purge import user_purger
+from app.core.security import verify_password_async
 from app.model.users import (
-    Item,
     Message,
     UpdatePassword,
     User,
     UserCreate,
     UserCreateOpen,
+    UserDeletionOut,
+    UserImportError,
     UserOut,
+    UsersImportOut,
     UsersOut,
     UserUpdate,
     UserUpdateMe,
 )
-from app.repository import users
-from app.utils import generate_new_account_email, send_email
+from app.repository import deletions, users
+from app.repository.counts import (
+    CountMode,
+    count_users,
+)
+from app.utils import (
+    encode_cursor,
+    etag_matches,
+    generate_new_account_email,
+    make_etag,
+    send_email,
+)
 
 router = APIRouter()
 
 
 @router.get(
-    "/", dependencies=[Depends(get_current_active_superuser)], response_model=UsersOut
+    "/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=UsersOut,
+    response_class=FastJSONResponse,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+async def read_users(
+    session: ReadSessionDep,
+    after_id: CursorIdDep,
+    skip: int = 0,
+    limit: int = 100,
+    count_mode: Annotated[CountMode, Query(alias="count")] = "exact",
+) -> Any:
     """
     Retrieve users.
+
+    Pass the returned `next_cursor` as `cursor` to fetch the following page,
+    `skip` is ignored when a cursor is given. Use `count=none` to skip the
+    total or `count=estimate` for a fast approximate total.
     """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    count = await count_users(session=session, mode=count_mode)
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    statement = select(User).order_by(col(User.id))
+    if after_id is not None:
+        statement = statement.where(col(User.id) > after_id)
+    else:
+        statement = statement.offset(skip)
+    # Fetch one extra row to know whether there is a next page
+    users = (await session.exec(statement.limit(limit + 1))).all()
+    next_cursor = None
+    if limit > 0 and len(users) > limit:
+        next_cursor = encode_cursor([users[limit - 1].id])
+    users = users[:limit]
 
-    return UsersOut(data=users, count=count)
+    return FastJSONResponse(UsersOut(data=users, count=count, next_cursor=next_cursor))
 
 
 @router.post(
     "/", dependencies=[Depends(get_current_active_superuser)], response_model=UserOut
 )
-def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
+async def create_user(*, session: AsyncSessionDep, user_in: UserCreate) -> Any:
     """
     Create new user.
     """
-    user = users.get_user_by_email(session=session, email=user_in.email)
-    if user:
+    user = await users.create_user_async(session=session, user_create=user_in)
+    if not user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
-
-    user = users.create_user(session=session, user_create=user_in)
     if settings.emails_enabled and user_in.email:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
-        send_email(
+        await send_email(
             email_to=user_in.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
@@ -72,58 +113,149 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
     return user
 
 
+@router.post(
+    "/import",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=UsersImportOut,
+)
+async def import_users(session: AsyncSessionDep, file: UploadFile) -> Any:
+    """
+    Create users from a CSV file with `email`, `password` and optionally
+    `full_name` columns. Rows that cannot be imported are reported by number.
+    """
+    # The upload is spooled to disk, rows are read and inserted in batches
+    reader = csv.DictReader(
+        io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    )
+    created = 0
+    errors: list[UserImportError] = []
+    seen_emails: set[str] = set()
+    row_number = 0
+    try:
+        fieldnames = await anyio.to_thread.run_sync(lambda: reader.fieldnames)
+        if not fieldnames or not {"email", "password"} <= set(fieldnames):
+            raise HTTPException(
+                status_code=400,
+                detail="The CSV file must have email and password columns",
+            )
+        while rows := await anyio.to_thread.run_sync(
+            lambda: list(islice(reader, settings.USERS_IMPORT_BATCH_SIZE))
+        ):
+            batch: list[tuple[int, UserCreate]] = []
+            for row in rows:
+                row_number += 1
+                email = (row.get("email") or "").strip()
+                password = row.get("password") or ""
+                if not email or not password:
+                    errors.append(
+                        UserImportError(
+                            row=row_number,
+                            email=email or None,
+                            error="Email and password are required",
+                        )
+                    )
+                elif email in seen_emails:
+                    errors.append(
+                        UserImportError(
+                            row=row_number,
+                            email=email,
+                            error="Duplicate email in the file",
+                        )
+                    )
+                else:
+                    seen_emails.add(email)
+                    user_in = UserCreate(
+                        email=email,
+                        password=password,
+                        full_name=(row.get("full_name") or "").strip() or None,
+                    )
+                    batch.append((row_number, user_in))
+            if not batch:
+                continue
+            results = await users.import_users_async(
+                session=session, users_in=[user_in for _, user_in in batch]
+            )
+            for (number, user_in), error in zip(batch, results, strict=True):
+                if error is None:
+                    created += 1
+                else:
+                    errors.append(
+                        UserImportError(row=number, email=user_in.email, error=error)
+                    )
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid CSV file after row {row_number}, "
+            f"{created} users were created",
+        )
+    errors.sort(key=lambda error: error.row)
+    return UsersImportOut(created=created, errors=errors)
+
+
 @router.patch("/me", response_model=UserOut)
-def update_user_me(
-    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
+async def update_user_me(
+    *, session: AsyncSessionDep, user_in: UserUpdateMe, current_user: CurrentUser
 ) -> Any:
     """
     Update own user.
     """
 
-    if user_in.email:
-        existing_user = users.get_user_by_email(session=session, email=user_in.email)
-        if existing_user and existing_user.id != current_user.id:
-            raise HTTPException(
-                status_code=409, detail="User with this email already exists"
-            )
-    user_data = user_in.model_dump(exclude_unset=True)
-    current_user.sqlmodel_update(user_data)
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return current_user
+    assert current_user.id is not None
+    try:
+        return await users.update_user_async(
+            session=session, user_id=current_user.id, user_in=user_in
+        )
+    except IntegrityError as e:
+        if not _is_email_taken(e):
+            raise
+        raise HTTPException(
+            status_code=409, detail="User with this email already exists"
+        )
 
 
 @router.patch("/me/password", response_model=Message)
-def update_password_me(
-    *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
+async def update_password_me(
+    *, session: AsyncSessionDep, body: UpdatePassword, current_user: CurrentUser
 ) -> Any:
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not await verify_password_async(
+        body.current_password, current_user.hashed_password
+    ):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
-    current_user.hashed_password = hashed_password
-    session.add(current_user)
-    session.commit()
+    assert current_user.id is not None
+    await users.update_password_async(
+        session=session, user_id=current_user.id, password=body.new_password
+    )
     return Message(message="Password updated successfully")
 
 
-@router.get("/me", response_model=UserOut)
-def read_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+@router.get(
+    "/me", response_model=UserOut, responses={304: {"description": "Not Modified"}}
+)
+async def read_user_me(
+    current_user: CurrentUser, response: Response, if_none_match: IfNoneMatch = None
+) -> Any:
     """
     Get current user.
+
+    The response has an ETag, send it back as `If-None-Match` to get an
+    empty 304 response while the user is unchanged.
     """
+    etag = make_etag([current_user.id, current_user.version])
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return current_user
 
 
 @router.post("/open", response_model=UserOut)
-def create_user_open(session: SessionDep, user_in: UserCreateOpen) -> Any:
+async def create_user_open(session: AsyncSessionDep, user_in: UserCreateOpen) -> Any:
     """
     Create new user without the need to be logged in.
     """
@@ -132,25 +264,24 @@ def create_user_open(session: SessionDep, user_in: UserCreateOpen) -> Any:
             status_code=403,
             detail="Open user registration is forbidden on this server",
         )
-    user = users.get_user_by_email(session=session, email=user_in.email)
-    if user:
+    user_create = UserCreate.from_orm(user_in)
+    user = await users.create_user_async(session=session, user_create=user_create)
+    if not user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
-    user_create = UserCreate.from_orm(user_in)
-    user = users.create_user(session=session, user_create=user_create)
     return user
 
 
 @router.get("/{user_id}", response_model=UserOut)
-def read_user_by_id(
-    user_id: int, session: SessionDep, current_user: CurrentUser
+async def read_user_by_id(
+    user_id: int, session: AsyncSessionDep, current_user: CurrentUser
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if user == current_user:
         return user
     if not current_user.is_superuser:
@@ -166,9 +297,9 @@ def read_user_by_id(
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UserOut,
 )
-def update_user(
+async def update_user(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     user_id: int,
     user_in: UserUpdate,
 ) -> Any:
@@ -176,44 +307,76 @@ def update_user(
     Update a user.
     """
 
-    db_user = session.get(User, user_id)
+    try:
+        db_user = await users.update_user_async(
+            session=session, user_id=user_id, user_in=user_in
+        )
+    except IntegrityError as e:
+        if not _is_email_taken(e):
+            raise
+        raise HTTPException(
+            status_code=409, detail="User with this email already exists"
+        )
     if not db_user:
+        # Only looked up when the update didn't match, to tell why
+        deletion = await deletions.get_user_deletion_async(
+            session=session, user_id=user_id
+        )
+        if deletion and deletion.status != "completed":
+            raise HTTPException(status_code=409, detail="The user is being deleted")
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
-    if user_in.email:
-        existing_user = users.get_user_by_email(session=session, email=user_in.email)
-        if existing_user and existing_user.id != user_id:
-            raise HTTPException(
-                status_code=409, detail="User with this email already exists"
-            )
-
-    db_user = users.update_user(session=session, db_user=db_user, user_in=user_in)
     return db_user
 
 
-@router.delete("/{user_id}")
-def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: int
+@router.delete("/{user_id}", status_code=202)
+async def delete_user(
+    session: AsyncSessionDep, current_user: CurrentUser, user_id: int
 ) -> Message:
     """
-    Delete a user.
+    Deactivate a user, the user and their items are then deleted in the
+    background. Progress is reported by GET /users/{user_id}/deletion.
     """
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    elif user != current_user and not current_user.is_superuser:
+    if user_id == current_user.id and current_user.is_superuser:
         raise HTTPException(
-            status_code=403, detail="The user doesn't have enough privileges"
+            status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    elif user == current_user and current_user.is_superuser:
+    if user_id != current_user.id and not current_user.is_superuser:
+        # Only looked up to answer 404 rather than 403 for unknown users
+        if not await session.get(User, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(
-            status_code=403, detail="Super users are not allowed to delete themselves"
+            status_code=403, detail="The user doesn't have enough privileges"
         )
 
-    statement = delete(Item).where(col(Item.owner_id) == user_id)
-    session.exec(statement)  # type: ignore
-    session.delete(user)
-    session.commit()
-    return Message(message="User deleted successfully")
+    deletion = await deletions.schedule_user_deletion_async(
+        session=session, user_id=user_id
+    )
+    if not deletion:
+        raise HTTPException(status_code=404, detail="User not found")
+    user_purger.notify()
+    return Message(message="User deletion started")
+
+
+@router.get(
+    "/{user_id}/deletion",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=UserDeletionOut,
+)
+async def read_user_deletion(session: AsyncSessionDep, user_id: int) -> Any:
+    """
+    Get the progress of a user deletion.
+    """
+    deletion = await deletions.get_user_deletion_async(session=session, user_id=user_id)
+    if not deletion:
+        raise HTTPException(status_code=404, detail="User deletion not found")
+    return deletion
+
+
+def _is_email_taken(e: IntegrityError) -> bool:
+    # Only the unique index on email means a conflict with another user,
+    # other violations are bugs and surface as server errors
+    diag = getattr(e.orig, "diag", None)
+    return getattr(diag, "constraint_name", None) == "ix_user_email"
@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Depends
+import os
+
+from fastapi import APIRouter, Depends, Response
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.model.users import Message
+from app.core.db import get_pool_status, pool_stats
+from app.core.health import readiness_check
+from app.model.users import (
+    CacheStatsOut,
+    DBPoolOut,
+    DBPoolsOut,
+    Message,
+    ReadinessOut,
+)
+from app.repository.item_cache import get_item_cache_stats
 from app.utils import generate_test_email, send_email
 
 router = APIRouter()
@@ -13,14 +24,66 @@ router = APIRouter()
     dependencies=[Depends(get_current_active_superuser)],
     status_code=201,
 )
-def test_email(email_to: EmailStr) -> Message:
+async def test_email(email_to: EmailStr) -> Message:
     """
     Test emails.
     """
     email_data = generate_test_email(email_to=email_to)
-    send_email(
+    await send_email(
         email_to=email_to,
         subject=email_data.subject,
         html_content=email_data.html_content,
     )
     return Message(message="Test email sent")
+
+
+@router.get(
+    "/db-pool",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=DBPoolsOut,
+)
+def db_pool() -> DBPoolsOut:
+    """
+    Database connection pool statistics of the worker serving the request.
+    """
+    pools = {
+        name: DBPoolOut.model_validate(get_pool_status(name)) for name in pool_stats
+    }
+    return DBPoolsOut(pid=os.getpid(), pools=pools)
+
+
+@router.get(
+    "/cache",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=CacheStatsOut,
+)
+async def cache_stats() -> CacheStatsOut:
+    """
+    Item cache hit ratio and memory use, hits are counted per worker.
+    """
+    return CacheStatsOut(pid=os.getpid(), **await get_item_cache_stats())
+
+
+@router.get("/health/live")
+async def health_live() -> Message:
+    """
+    Liveness probe, answers as long as the worker serves requests at all.
+    """
+    return Message(message="OK")
+
+
+@router.get(
+    "/health/ready",
+    response_model=ReadinessOut,
+    responses={503: {"model": ReadinessOut, "description": "Not ready"}},
+)
+async def health_ready(response: Response) -> ReadinessOut:
+    """
+    Readiness probe, 503 while the database is unreachable from this worker's
+    pool or not migrated to the head revision. Checked at most every
+    HEALTH_CHECK_CACHE_SECONDS.
+    """
+    readiness = ReadinessOut.model_validate(await readiness_check.get())
+    if not readiness.ready:
+        response.status_code = 503
+    return readiness
@@ -2,20 +2,30 @@ import logging
 
 from sqlalchemy import Engine
 from sqlmodel import Session, select
-from tenacity import after_log, before_log, retry, stop_after_attempt, wait_fixed
+from tenacity import (
+    after_log,
+    before_log,
+    retry,
+    stop_after_delay,
+    wait_random_exponential,
+)
 
 from app.core.db import engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-max_tries = 60 * 5  # 5 minutes
-wait_seconds = 1
+# Waits between tries are random up to an exponentially growing bound, from
+# initial_wait_seconds to max_wait_seconds, so containers started together
+# don't retry in lockstep. Gives up after deadline_seconds in total
+initial_wait_seconds = 0.1
+max_wait_seconds = 5
+deadline_seconds = 60 * 5  # 5 minutes
 
 
 @retry(
-    stop=stop_after_attempt(max_tries),
-    wait=wait_fixed(wait_seconds),
+    stop=stop_after_delay(deadline_seconds),
+    wait=wait_random_exponential(multiplier=initial_wait_seconds, max=max_wait_seconds),
     before=before_log(logger, logging.INFO),
     after=after_log(logger, logging.WARN),
 )
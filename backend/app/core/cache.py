@@ -0,0 +1,255 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Generic, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Bounded in-process LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, *, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def add(self, key: K, value: V, ttl: float | None = None) -> None:
+        """
+        Set the key unless it holds an unexpired value.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._set(key, value, ttl)
+
+    def _set(self, key: K, value: V, ttl: float | None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def values(self) -> list[V]:
+        with self._lock:
+            return [value for _, value in self._data.values()]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class Cache(ABC):
+    """
+    Cache of serialized values shared by the routes, see create_cache().
+
+    Invalidated keys hold an empty tombstone for a while, add() doesn't
+    replace it. That way a read that started before a write, or that a read
+    replica served from before it, can't put the old value back.
+    """
+
+    name: str
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    async def get(self, key: str) -> bytes | None:
+        value = await self._get(key)
+        if value:
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    async def invalidate(self, *keys: str) -> None:
+        await self._set_many(keys, b"", settings.CACHE_INVALIDATION_HOLD_SECONDS)
+
+    @abstractmethod
+    async def _get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def add(self, key: str, value: bytes, ttl: float) -> None:
+        """
+        Set the key unless it already has a value or tombstone.
+        """
+
+    @abstractmethod
+    async def _set_many(self, keys: tuple[str, ...], value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def memory_bytes(self) -> int:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+
+class NullCache(Cache):
+    """
+    Caches nothing, every read goes to the database.
+    """
+
+    name = "none"
+
+    async def _get(self, key: str) -> bytes | None:
+        return None
+
+    async def add(self, key: str, value: bytes, ttl: float) -> None:
+        pass
+
+    async def _set_many(self, keys: tuple[str, ...], value: bytes, ttl: float) -> None:
+        pass
+
+    async def memory_bytes(self) -> int:
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCache(Cache):
+    """
+    Least recently used entries of the current process.
+    """
+
+    name = "memory"
+
+    def __init__(self, *, maxsize: int) -> None:
+        super().__init__()
+        self._entries: TTLCache[str, bytes] = TTLCache(maxsize=maxsize, ttl=0)
+
+    async def _get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries.add(key, value, ttl)
+
+    async def _set_many(self, keys: tuple[str, ...], value: bytes, ttl: float) -> None:
+        for key in keys:
+            self._entries.set(key, value, ttl)
+
+    async def memory_bytes(self) -> int:
+        # The values only, keys and bookkeeping are comparatively small
+        return sum(len(value) for value in self._entries.values())
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisCache(Cache):
+    """
+    Entries in a server speaking the Redis protocol, shared by all processes.
+    The cache is skipped while the server is unreachable.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str) -> None:
+        super().__init__()
+        # Imported here so the memory cache doesn't need the client
+        from redis.asyncio import Redis
+
+        self._client: Redis = Redis.from_url(
+            url,
+            socket_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+        )
+
+    async def _get(self, key: str) -> bytes | None:
+        from redis.exceptions import RedisError
+
+        try:
+            value: bytes | None = await self._client.get(key)
+        except RedisError as e:
+            logger.warning(f"Cache get failed: {e}")
+            return None
+        return value
+
+    async def add(self, key: str, value: bytes, ttl: float) -> None:
+        from redis.exceptions import RedisError
+
+        try:
+            await self._client.set(key, value, px=int(ttl * 1000), nx=True)
+        except RedisError as e:
+            logger.warning(f"Cache add failed: {e}")
+
+    async def _set_many(self, keys: tuple[str, ...], value: bytes, ttl: float) -> None:
+        from redis.exceptions import RedisError
+
+        try:
+            async with self._client.pipeline(transaction=False) as pipeline:
+                for key in keys:
+                    pipeline.set(key, value, px=int(ttl * 1000))
+                await pipeline.execute()
+        except RedisError as e:
+            # The entries expire after CACHE_TTL_SECONDS at the latest
+            logger.error(f"Cache invalidation failed: {e}")
+
+    async def memory_bytes(self) -> int:
+        from redis.exceptions import RedisError
+
+        try:
+            info = await self._client.info("memory")
+        except RedisError as e:
+            logger.warning(f"Cache info failed: {e}")
+            return 0
+        return int(info["used_memory"])
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_cache() -> Cache:
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache(settings.CACHE_REDIS_URL)
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCache(maxsize=settings.CACHE_MAX_SIZE)
+    return NullCache()
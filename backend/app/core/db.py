@@ -1,10 +1,174 @@
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import (
+    AsyncAdaptedQueuePool,
+    ConnectionPoolEntry,
+    PoolProxiedConnection,
+    QueuePool,
+)
 from sqlmodel import Session, create_engine, select
 
 from app.core.config import settings
+from app.core.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_TIMEOUTS,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_OVERFLOW,
+)
 from app.model.users import User, UserCreate
 from app.repository import users
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
+class PoolStats:
+    """
+    Counters of one engine's connection pool, for the current process. Also
+    exported to /metrics, labelled with the pool name.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # The sync engine checks out connections from the threadpool's threads
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self.connections_created += 1
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+        DB_POOL_CHECKOUT_TIMEOUTS.labels(self.name).inc()
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        DB_POOL_CHECKOUT_WAIT.labels(self.name).observe(seconds)
+
+    def record_usage(self, pool: QueuePool) -> None:
+        DB_POOL_CHECKED_OUT.labels(self.name).set(pool.checkedout())
+        # Negative while connections of the base pool are still unopened
+        DB_POOL_OVERFLOW.labels(self.name).set(max(pool.overflow(), 0))
+
+
+def _instrumented_pool_class(
+    pool_class: type[QueuePool], stats: PoolStats
+) -> type[QueuePool]:
+    # A subclass rather than an attribute, so it survives Pool.recreate()
+    class InstrumentedPool(pool_class):  # type: ignore[valid-type,misc]
+        def connect(self) -> PoolProxiedConnection:
+            start = time.perf_counter()
+            try:
+                connection = super().connect()
+            except PoolTimeoutError:
+                stats.record_timeout()
+                raise
+            finally:
+                stats.record_wait(time.perf_counter() - start)
+            stats.record_usage(self)
+            return connection  # type: ignore[no-any-return]
+
+        def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+            # Called once the connection is back in the pool, or closed when
+            # it was an overflow one
+            super()._do_return_conn(record)
+            stats.record_usage(self)
+
+    return InstrumentedPool
+
+
+def _listen_pool_events(target: Engine, stats: PoolStats) -> None:
+    @event.listens_for(target, "connect")
+    def on_connect(*args: Any) -> None:
+        stats.record_connect()
+
+    @event.listens_for(target, "checkout")
+    def on_checkout(*args: Any) -> None:
+        stats.record_checkout()
+
+
+def _pool_options() -> dict[str, Any]:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+pool_stats = {name: PoolStats(name) for name in ("sync", "async")}
+pool_stats.update(
+    (f"replica-{index}", PoolStats(f"replica-{index}"))
+    for index in range(len(settings.POSTGRES_REPLICA_URIS))
+)
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=_instrumented_pool_class(QueuePool, pool_stats["sync"]),
+    **_pool_options(),
+)
+# Used by the request path; the "postgresql+psycopg" URL resolves to the
+# psycopg async dialect when passed to create_async_engine
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=_instrumented_pool_class(AsyncAdaptedQueuePool, pool_stats["async"]),
+    **_pool_options(),
+)
+# Read-only sessions, see app/core/replicas.py
+replica_engines = [
+    create_async_engine(
+        str(uri),
+        poolclass=_instrumented_pool_class(
+            AsyncAdaptedQueuePool, pool_stats[f"replica-{index}"]
+        ),
+        **_pool_options(),
+    )
+    for index, uri in enumerate(settings.POSTGRES_REPLICA_URIS)
+]
+_listen_pool_events(engine, pool_stats["sync"])
+_listen_pool_events(async_engine.sync_engine, pool_stats["async"])
+for index, replica_engine in enumerate(replica_engines):
+    _listen_pool_events(replica_engine.sync_engine, pool_stats[f"replica-{index}"])
+
+
+def get_pool_status(name: str) -> dict[str, Any]:
+    target: Engine | AsyncEngine
+    if name == "sync":
+        target = engine
+    elif name == "async":
+        target = async_engine
+    else:
+        target = replica_engines[int(name.removeprefix("replica-"))]
+    pool = target.pool
+    assert isinstance(pool, QueuePool)
+    stats = pool_stats[name]
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # Negative while connections of the base pool are still unopened
+        "overflow": max(pool.overflow(), 0),
+        "connections_created": stats.connections_created,
+        "checkouts": stats.checkouts,
+        "timeouts": stats.timeouts,
+        "wait_seconds_total": stats.wait_seconds_total,
+        "wait_seconds_max": stats.wait_seconds_max,
+    }
 
 
 # make sure all SQLModel model are imported (app.model) before initializing DB
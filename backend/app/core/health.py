@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from functools import cache
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.core.db import async_engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_DIR = Path(__file__).parents[1] / "alembic"
+
+
+@cache
+def get_migration_head() -> str | None:
+    """
+    Latest migration of the code, the database must be at this revision.
+    """
+    # Imported here, Alembic is only needed once per process
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory(str(ALEMBIC_DIR)).get_current_head()
+
+
+async def _get_migration() -> str | None:
+    async with async_engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT version_num FROM alembic_version")
+        )
+        return result.scalar()
+
+
+class ReadinessCheck:
+    """
+    Whether the worker can serve requests: a connection of its pool answers
+    within HEALTH_CHECK_TIMEOUT_SECONDS and the database is migrated to the
+    head revision of the code.
+
+    The result is reused for HEALTH_CHECK_CACHE_SECONDS and concurrent probes
+    wait for the same check, so probes don't add load on Postgres.
+    """
+
+    def __init__(self) -> None:
+        self._result: dict[str, Any] | None = None
+        self._checked_at = 0.0
+        self._task: asyncio.Task[dict[str, Any]] | None = None
+
+    async def get(self) -> dict[str, Any]:
+        age = time.monotonic() - self._checked_at
+        if self._result is not None and age < settings.HEALTH_CHECK_CACHE_SECONDS:
+            return self._result
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._check())
+        # A cancelled probe doesn't cancel the check the others wait for
+        return await asyncio.shield(self._task)
+
+    async def _check(self) -> dict[str, Any]:
+        head = get_migration_head()
+        try:
+            migration = await asyncio.wait_for(
+                _get_migration(), settings.HEALTH_CHECK_TIMEOUT_SECONDS
+            )
+            database = True
+        except (SQLAlchemyError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"Readiness check failed: {e!r}")
+            migration = None
+            database = False
+        if database and migration != head:
+            logger.warning(f"Database is at migration {migration}, expected {head}")
+        self._result = {
+            "ready": database and migration == head,
+            "database": database,
+            "migration": migration,
+            "migration_head": head,
+        }
+        self._checked_at = time.monotonic()
+        return self._result
+
+
+readiness_check = ReadinessCheck()
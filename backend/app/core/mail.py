@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import smtplib
+from dataclasses import dataclass
+
+import anyio
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutgoingEmail:
+    email_to: str
+    subject: str
+    html_content: str
+    # Failed delivery attempts of this email
+    attempts: int = 0
+
+
+def _connect() -> smtplib.SMTP:
+    assert settings.SMTP_HOST
+    timeout = settings.SMTP_TIMEOUT_SECONDS
+    connection: smtplib.SMTP
+    if settings.SMTP_SSL and not settings.SMTP_TLS:
+        connection = smtplib.SMTP_SSL(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=timeout
+        )
+    else:
+        connection = smtplib.SMTP(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=timeout
+        )
+    # The socket is open, don't leak it when the handshake fails, e.g. with
+    # wrong credentials on every retry
+    try:
+        if settings.SMTP_TLS:
+            connection.starttls()
+        if settings.SMTP_USER:
+            connection.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+    except BaseException:
+        connection.close()
+        raise
+    return connection
+
+
+def _close(connection: smtplib.SMTP) -> None:
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        connection.close()
+
+
+def _is_permanent(error: smtplib.SMTPException) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _deliver(
+    connection: smtplib.SMTP | None, batch: list[OutgoingEmail]
+) -> tuple[smtplib.SMTP | None, list[OutgoingEmail], int]:
+    """
+    Send the batch over one connection, opening it if needed. Returns the
+    connection to reuse (None when it broke), the emails to retry and the
+    number of emails rejected for good.
+
+    Only emails whose own delivery failed count an attempt, the ones a broken
+    connection left unsent don't. Neither does the first email on a reused
+    connection that turns out to be closed by the server.
+    """
+    # Imported on first delivery, the emails package pulls in requests
+    import emails  # type: ignore
+
+    assert settings.EMAILS_FROM_EMAIL
+    reused = connection is not None
+    try:
+        if connection is None:
+            connection = _connect()
+    except OSError as e:
+        logger.warning(f"SMTP connection failed, will retry: {e}")
+        for email in batch:
+            email.attempts += 1
+        return None, batch, 0
+
+    retry: list[OutgoingEmail] = []
+    rejected = 0
+    for index, email in enumerate(batch):
+        try:
+            message = emails.Message(
+                subject=email.subject,
+                html=email.html_content,
+                mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+                mail_to=email.email_to,
+            )
+            connection.sendmail(
+                settings.EMAILS_FROM_EMAIL, [email.email_to], message.as_string()
+            )
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+            # The server answered, the connection stays usable
+            if _is_permanent(e):
+                logger.error(f"Email to {email.email_to} rejected: {e}")
+                rejected += 1
+            else:
+                logger.warning(f"Email to {email.email_to} deferred: {e}")
+                email.attempts += 1
+                retry.append(email)
+        except OSError as e:
+            # Includes the other SMTPExceptions, such as SMTPServerDisconnected
+            logger.warning(f"SMTP delivery failed, will retry: {e}")
+            connection.close()
+            if not (reused and index == 0):
+                email.attempts += 1
+            return None, retry + batch[index:], rejected
+        except Exception as e:
+            # E.g. an address smtplib can't encode, retrying won't help
+            logger.error(f"Email to {email.email_to} rejected: {e!r}")
+            rejected += 1
+            try:
+                # The failed transaction may have been left open
+                connection.rset()
+            except OSError:
+                connection.close()
+                return None, retry + batch[index + 1 :], rejected
+    return connection, retry, rejected
+
+
+class MailDispatcher:
+    """
+    Deliver emails in the background so requests only pay for queueing them.
+
+    SMTP_POOL_SIZE workers each keep one SMTP connection open and send
+    whatever is queued in batches of up to SMTP_BATCH_SIZE over it. An email
+    that fails temporarily is retried up to SMTP_MAX_RETRIES times with
+    exponential backoff, without holding up the rest of its batch. Emails the
+    server rejects for good, or that can't be sent at all, are dropped. The
+    queue holds at most EMAILS_QUEUE_MAX_SIZE emails, beyond
+    that enqueue() waits for room.
+    """
+
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[OutgoingEmail] | None = None
+        self._workers: list[asyncio.Task[None]] = []
+        self.sent = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=settings.EMAILS_QUEUE_MAX_SIZE)
+        self._workers = [
+            asyncio.create_task(self._work(self._queue))
+            for _ in range(settings.SMTP_POOL_SIZE)
+        ]
+
+    async def enqueue(self, email: OutgoingEmail) -> None:
+        # Started on first use so it runs on the serving event loop
+        if self._queue is None:
+            self.start()
+        assert self._queue is not None
+        await self._queue.put(email)
+
+    async def join(self) -> None:
+        """
+        Wait until every queued email was sent or given up on.
+        """
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self, timeout: float = 10) -> None:
+        """
+        Give queued emails up to `timeout` seconds to go out, then stop the
+        workers and close their connections.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} queued emails")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+
+    async def _work(self, queue: asyncio.Queue[OutgoingEmail]) -> None:
+        connection: smtplib.SMTP | None = None
+        try:
+            while True:
+                try:
+                    # Keep an idle connection open only for a while
+                    timeout = None if connection is None else settings.SMTP_IDLE_SECONDS
+                    email = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    assert connection is not None
+                    await anyio.to_thread.run_sync(_close, connection)
+                    connection = None
+                    continue
+                batch = [email]
+                while len(batch) < settings.SMTP_BATCH_SIZE and not queue.empty():
+                    batch.append(queue.get_nowait())
+                try:
+                    connection = await self._send(connection, batch)
+                except Exception:
+                    logger.exception(f"Sending {len(batch)} emails failed")
+                    self.failed += len(batch)
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+                finally:
+                    for _ in batch:
+                        queue.task_done()
+        finally:
+            if connection is not None:
+                connection.close()
+
+    async def _send(
+        self, connection: smtplib.SMTP | None, batch: list[OutgoingEmail]
+    ) -> smtplib.SMTP | None:
+        pending = batch
+        deferred: list[OutgoingEmail] = []
+        while True:
+            connection, retry, rejected = await anyio.to_thread.run_sync(
+                _deliver, connection, pending
+            )
+            self.sent += len(pending) - len(retry) - rejected
+            self.failed += rejected
+            # Emails left unsent by a broken connection go out again right
+            # away, the ones that failed themselves wait for their backoff
+            # and don't hold up the others
+            pending = []
+            for email in retry:
+                if email.attempts > settings.SMTP_MAX_RETRIES:
+                    logger.error(f"Giving up on email to {email.email_to}")
+                    self.failed += 1
+                elif email.attempts:
+                    deferred.append(email)
+                else:
+                    pending.append(email)
+            if pending:
+                continue
+            if not deferred:
+                return connection
+            attempts = max(email.attempts for email in deferred)
+            await asyncio.sleep(
+                settings.SMTP_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+            )
+            pending, deferred = deferred, []
+
+
+mail_dispatcher = MailDispatcher()
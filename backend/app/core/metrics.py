@@ -0,0 +1,222 @@
+import logging
+import os
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess as prometheus_multiprocess
+from sqlalchemy import Engine, event
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# With several gunicorn workers, each process writes its samples to files in
+# PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them. gunicorn_conf.py sets
+# it for the workers only, other processes use the in-memory registry
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests served", ["route", "method", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving HTTP requests",
+    ["route", "method"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries executed per HTTP request",
+    ["route", "method"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per HTTP request",
+    ["route", "method"],
+)
+
+# Process pool of app.core.security that hashes passwords
+PASSWORD_HASH_WORKERS = Gauge(
+    "password_hash_workers",
+    "Processes of the password hashing pools",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_JOBS_PENDING = Gauge(
+    "password_hash_jobs_pending",
+    "Password hashes and verifications queued or running in the process pools",
+    multiprocess_mode="livesum",
+)
+
+# Connection pools of app.core.db, labelled sync, async or replica-<index>
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond the pool size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection of the pool",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts",
+    "Checkouts that gave up after DB_POOL_TIMEOUT",
+    ["pool"],
+)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    # Executions per parameterised statement, an N+1 shows up as one entry
+    # with a high count
+    statements: StatementCounter[str] = field(default_factory=StatementCounter)
+
+
+request_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        *args: Any,
+    ) -> None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        *args: Any,
+    ) -> None:
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = request_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.statements[statement] += 1
+
+
+class MetricsMiddleware:
+    """
+    Record count, latency and database usage of each request, labelled by
+    the unique id of the route that served it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = QueryStats()
+        token = request_query_stats.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.labels(method).inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            REQUESTS_IN_PROGRESS.labels(method).dec()
+            request_query_stats.reset(token)
+            # Set by the router, unmatched paths share one label
+            route = getattr(scope.get("route"), "unique_id", "unmatched")
+            REQUESTS.labels(route, method, status_code).inc()
+            REQUEST_DURATION.labels(route, method).observe(duration)
+            REQUEST_DB_QUERIES.labels(route, method).observe(stats.count)
+            REQUEST_DB_DURATION.labels(route, method).observe(stats.seconds)
+
+
+class RepeatedQueryMiddleware:
+    """
+    Log a warning when a request executes the same statement more than
+    `threshold` times, which usually means an N+1 query. Meant for local
+    development.
+    """
+
+    def __init__(self, app: ASGIApp, threshold: int) -> None:
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Share the stats of MetricsMiddleware when it wraps this one
+        stats = request_query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = request_query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                request_query_stats.reset(token)
+            for statement, count in stats.statements.items():
+                if count > self.threshold:
+                    logger.warning(
+                        "%s %s executed the same statement %d times: %s",
+                        scope["method"],
+                        scope["path"],
+                        count,
+                        statement,
+                    )
+
+
+def metrics(request: Request) -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.repository.counts import invalidate_item_count, invalidate_user_count
+from app.repository.deletions import purge_next_chunk_async
+
+logger = logging.getLogger(__name__)
+
+
+class UserPurger:
+    """
+    Purge deleted users and their items in the background, one transaction of
+    USER_PURGE_CHUNK_SIZE items at a time so no request or concurrent writer
+    waits on a huge delete.
+
+    notify() wakes it up when this process schedules a deletion, it also polls
+    every USER_PURGE_POLL_SECONDS for deletions scheduled by other processes or
+    interrupted by a restart.
+    """
+
+    def __init__(self) -> None:
+        self._wakeup: asyncio.Event | None = None
+        self._lock: asyncio.Lock | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wakeup = None
+        self._lock = None
+
+    async def purge_pending(self) -> None:
+        """
+        Purge until no deletion is left. Waits for a purge already running in
+        this process, deletions locked by other processes are left to them.
+        """
+        async with self._lock or asyncio.Lock(), AsyncSession(
+            async_engine, expire_on_commit=False
+        ) as session:
+            while deletion := await purge_next_chunk_async(
+                session=session, chunk_size=settings.USER_PURGE_CHUNK_SIZE
+            ):
+                logger.info(
+                    f"Purging user {deletion.user_id}: {deletion.items_deleted}"
+                    f"/{deletion.items_total} items deleted"
+                )
+                if deletion.status == "completed":
+                    invalidate_user_count()
+                    invalidate_item_count(deletion.user_id)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await self.purge_pending()
+            except Exception:
+                logger.exception("Purging deleted users failed")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), settings.USER_PURGE_POLL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+user_purger = UserPurger()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from http.cookies import SimpleCookie
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import async_engine, replica_engines
+
+logger = logging.getLogger(__name__)
+
+# Unix time of the client's last write, so any worker sends its reads to the
+# primary, see ReadYourWritesMiddleware
+LAST_WRITE_COOKIE = "last_write"
+
+# Seconds the replica's replay is behind the primary. Zero once it replayed
+# everything it received, so an idle primary doesn't look like lag, and on a
+# server that isn't a standby at all
+REPLICA_LAG_QUERY = text(
+    "SELECT COALESCE(CASE "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+    "END, 0)"
+)
+
+
+async def _get_lag(engine: AsyncEngine) -> float:
+    async with engine.connect() as connection:
+        return float((await connection.execute(REPLICA_LAG_QUERY)).scalar_one())
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        # Unknown until the first check, so reads start on the primary
+        self.checked = False
+        self.healthy = False
+        self.lag = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+class ReplicaRouter:
+    """
+    Pick the engine of read-only sessions.
+
+    Reads are spread round-robin over the replicas that answered the last
+    check in time and lag behind the primary by at most
+    REPLICA_MAX_LAG_SECONDS. They fall back to the primary when none does,
+    and for READ_YOUR_WRITES_SECONDS after the same client wrote something:
+    the time of its last write comes with the request, or the client wrote
+    through this worker. Replicas are checked every
+    REPLICA_CHECK_INTERVAL_SECONDS in the background.
+    """
+
+    def __init__(self, engines: list[AsyncEngine]) -> None:
+        self.replicas = [Replica(engine) for engine in engines]
+        self._next = 0
+        self._task: asyncio.Task[None] | None = None
+        # Clients that wrote recently through this worker, keyed by their
+        # credentials, for the ones that don't send the cookie back
+        self._writers: TTLCache[str, bool] = TTLCache(
+            maxsize=settings.READ_YOUR_WRITES_MAX_CLIENTS,
+            ttl=settings.READ_YOUR_WRITES_SECONDS,
+        )
+
+    def get_engine(
+        self, client: str | None = None, last_write: float | None = None
+    ) -> AsyncEngine:
+        if last_write is not None:
+            # A time in the future is as stale as the cookie can get
+            if 0 <= time.time() - last_write < settings.READ_YOUR_WRITES_SECONDS:
+                return async_engine
+        if client is not None and self._writers.get(client):
+            return async_engine
+        available = [replica for replica in self.replicas if replica.available]
+        if not available:
+            return async_engine
+        self._next = (self._next + 1) % len(available)
+        return available[self._next].engine
+
+    def record_write(self, client: str | None) -> None:
+        if client is not None and self.replicas:
+            self._writers.set(client, True)
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def _check(self, replica: Replica) -> None:
+        was_available = replica.available
+        try:
+            lag = await asyncio.wait_for(
+                _get_lag(replica.engine), settings.REPLICA_CHECK_INTERVAL_SECONDS
+            )
+        except (SQLAlchemyError, OSError, asyncio.TimeoutError) as e:
+            if replica.healthy or not replica.checked:
+                logger.warning(f"Replica {replica.engine.url!r} is unreachable: {e!r}")
+            replica.checked = True
+            replica.healthy = False
+            return
+        replica.checked = True
+        replica.healthy = True
+        replica.lag = lag
+        if was_available and not replica.available:
+            logger.warning(
+                f"Replica {replica.engine.url!r} lags {replica.lag:.1f}s behind"
+            )
+        elif not was_available and replica.available:
+            logger.info(f"Replica {replica.engine.url!r} is serving reads")
+
+    def start(self) -> None:
+        if self.replicas:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.REPLICA_CHECK_INTERVAL_SECONDS)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Send the LAST_WRITE_COOKIE with the successful responses of requests that
+    wrote to the primary, flagged by get_async_db in the request state. It
+    expires after READ_YOUR_WRITES_SECONDS.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+                and scope.get("state", {}).get("wrote_to_primary")
+            ):
+                MutableHeaders(scope=message).append("set-cookie", _last_write_cookie())
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _last_write_cookie() -> str:
+    cookie: SimpleCookie = SimpleCookie()
+    cookie[LAST_WRITE_COOKIE] = f"{time.time():.3f}"
+    cookie[LAST_WRITE_COOKIE]["max-age"] = int(settings.READ_YOUR_WRITES_SECONDS)
+    cookie[LAST_WRITE_COOKIE]["path"] = "/"
+    cookie[LAST_WRITE_COOKIE]["httponly"] = True
+    cookie[LAST_WRITE_COOKIE]["samesite"] = "lax"
+    return cookie.output(header="").strip()
+
+
+def get_last_write(cookie: str | None) -> float | None:
+    if cookie is None:
+        return None
+    try:
+        return float(cookie)
+    except ValueError:
+        return None
+
+
+replica_router = ReplicaRouter(replica_engines)
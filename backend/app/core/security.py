@@ -1,27 +1,130 @@
+import asyncio
+import multiprocessing
+import threading
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Any
+from functools import cache
+from typing import TYPE_CHECKING, Any, TypeVar
 
-from jose import jwt
-from passlib.context import CryptContext
+import anyio
 
 from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_JOBS_PENDING, PASSWORD_HASH_WORKERS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+T = TypeVar("T")
+
+# jose and passlib are slow to import, they are imported on first use so
+# processes that never handle tokens or passwords don't pay for them
+
+
+@cache
+def get_pwd_context() -> "CryptContext":
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 ALGORITHM = "HS256"
 
 
 def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+    from jose import jwt
+
     expire = datetime.utcnow() + expires_delta
     to_encode = {"exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> dict[str, Any] | None:
+    """
+    Claims of a valid access token, None if it is invalid or expired.
+    """
+    from jose import JWTError, jwt
+
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+# bcrypt is CPU bound and holds the GIL, async callers dispatch it to a
+# dedicated process pool so it scales across cores without blocking the API
+_password_executor: ProcessPoolExecutor | None = None
+_password_executor_lock = threading.Lock()
+_password_jobs_pending = 0
+
+
+def get_password_executor() -> ProcessPoolExecutor | None:
+    global _password_executor
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    with _password_executor_lock:
+        if _password_executor is None:
+            # Workers are spawned rather than forked from a threaded server
+            _password_executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            PASSWORD_HASH_WORKERS.set(settings.PASSWORD_HASH_WORKERS)
+        return _password_executor
+
+
+def shutdown_password_executor() -> None:
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is not None:
+            _password_executor.shutdown(wait=False, cancel_futures=True)
+            _password_executor = None
+            PASSWORD_HASH_WORKERS.set(0)
+
+
+def password_executor_stats() -> dict[str, int]:
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "pending": _password_jobs_pending,
+    }
+
+
+async def _run_password_job(func: Callable[..., T], *args: Any) -> T:
+    global _password_jobs_pending
+    executor = get_password_executor()
+    if executor is None:
+        return await anyio.to_thread.run_sync(func, *args)
+    _password_jobs_pending += 1
+    PASSWORD_HASH_JOBS_PENDING.inc()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # A worker died, start a fresh pool on the next call
+        shutdown_password_executor()
+        return await anyio.to_thread.run_sync(func, *args)
+    finally:
+        _password_jobs_pending -= 1
+        PASSWORD_HASH_JOBS_PENDING.dec()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+
+async def get_password_hashes_async(passwords: list[str]) -> list[str]:
+    return list(await asyncio.gather(*map(get_password_hash_async, passwords)))
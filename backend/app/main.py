@@ -1,19 +1,54 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import async_engine, engine, replica_engines
+from app.core.mail import mail_dispatcher
+from app.core.metrics import (
+    MetricsMiddleware,
+    RepeatedQueryMiddleware,
+    instrument_engine,
+    metrics,
+)
+from app.core.purge import user_purger
+from app.core.replicas import ReadYourWritesMiddleware, replica_router
+from app.core.security import shutdown_password_executor
+from app.repository.item_cache import item_cache
+from app.utils import load_email_templates
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if settings.emails_enabled:
+        load_email_templates()
+    user_purger.start()
+    replica_router.start()
+    yield
+    await replica_router.stop()
+    await user_purger.stop()
+    await mail_dispatcher.stop()
+    await item_cache.close()
+    # Pooled async connections are bound to the event loop that opened them
+    await async_engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+    shutdown_password_executor()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -28,4 +63,16 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+if settings.ENVIRONMENT == "local":
+    app.add_middleware(
+        RepeatedQueryMiddleware, threshold=settings.REPEATED_QUERY_WARNING_THRESHOLD
+    )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+for replica_engine in replica_engines:
+    instrument_engine(replica_engine.sync_engine)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.add_route("/metrics", metrics, include_in_schema=False)
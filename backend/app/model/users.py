@@ -1,6 +1,18 @@
+from datetime import datetime
+
+from pydantic import field_validator
+from sqlalchemy import Column, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, Relationship, SQLModel
 
 
+def _reject_null(value: str | None) -> str:
+    # Fields of updates may be left out, but not cleared
+    if value is None:
+        raise ValueError("may be omitted but not null")
+    return value
+
+
 # Shared properties
 # TODO replace email str with EmailStr when sqlmodel supports it
 class UserBase(SQLModel):
@@ -28,12 +40,16 @@ class UserUpdate(UserBase):
     email: str | None = None  # type: ignore
     password: str | None = None
 
+    email_not_null = field_validator("email")(_reject_null)
+
 
 # TODO replace email str with EmailStr when sqlmodel supports it
 class UserUpdateMe(SQLModel):
     full_name: str | None = None
     email: str | None = None
 
+    email_not_null = field_validator("email")(_reject_null)
+
 
 class UpdatePassword(SQLModel):
     current_password: str
@@ -44,6 +60,8 @@ class UpdatePassword(SQLModel):
 class User(UserBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
     hashed_password: str
+    # Bumped on every change of the user, identifies the representation in ETags
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     items: list["Item"] = Relationship(back_populates="owner")
 
 
@@ -54,7 +72,19 @@ class UserOut(UserBase):
 
 class UsersOut(SQLModel):
     data: list[UserOut]
-    count: int
+    count: int | None
+    next_cursor: str | None = None
+
+
+class UserImportError(SQLModel):
+    row: int
+    email: str | None = None
+    error: str
+
+
+class UsersImportOut(SQLModel):
+    created: int
+    errors: list[UserImportError]
 
 
 # Shared properties
@@ -75,12 +105,52 @@ class ItemUpdate(ItemBase):
 
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    # Serves the owner filter of listings, ordered by id, and deletes by owner
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
     id: int | None = Field(default=None, primary_key=True)
     title: str
     owner_id: int | None = Field(default=None, foreign_key="user.id", nullable=False)
+    # Bumped on every change of the item, identifies the representation in ETags
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     owner: User | None = Relationship(back_populates="items")
 
 
+# Full-text search document, generated by Postgres. It is part of the table but
+# deliberately left unmapped so regular item queries don't fetch it.
+ITEM_SEARCH_CONFIG = "simple"
+item_search_vector = Column(
+    "search_vector",
+    TSVECTOR,
+    Computed(
+        f"to_tsvector('{ITEM_SEARCH_CONFIG}'::regconfig, "
+        "title || ' ' || coalesce(description, ''))",
+        persisted=True,
+    ),
+)
+Item.__table__.append_column(item_search_vector)  # type: ignore[attr-defined]
+Index("ix_item_search_vector", item_search_vector, postgresql_using="gin")
+
+
+class UserDeletionBase(SQLModel):
+    status: str = "pending"  # pending, running or completed
+    items_total: int | None = None
+    items_deleted: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: datetime | None = None
+
+
+# Progress of purging a deleted user's items in the background. Not a foreign
+# key, the row is kept as a record once the user is gone.
+class UserDeletion(UserDeletionBase, table=True):
+    user_id: int = Field(primary_key=True)
+
+
+class UserDeletionOut(UserDeletionBase):
+    user_id: int
+
+
 # Properties to return via API, id is always required
 class ItemOut(ItemBase):
     id: int
@@ -89,7 +159,8 @@ class ItemOut(ItemBase):
 
 class ItemsOut(SQLModel):
     data: list[ItemOut]
-    count: int
+    count: int | None
+    next_cursor: str | None = None
 
 
 # Generic message
@@ -97,6 +168,43 @@ class Message(SQLModel):
     message: str
 
 
+class DBPoolOut(SQLModel):
+    size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    connections_created: int
+    checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
+# Connection pools of the worker process that served the request
+class DBPoolsOut(SQLModel):
+    pid: int
+    pools: dict[str, DBPoolOut]
+
+
+# Item cache counters of the worker process that served the request, memory
+# is the Redis server's for the redis backend
+class CacheStatsOut(SQLModel):
+    pid: int
+    backend: str
+    hits: int
+    misses: int
+    hit_ratio: float
+    memory_bytes: int
+
+
+# Readiness of the worker process that served the request
+class ReadinessOut(SQLModel):
+    ready: bool
+    database: bool
+    migration: str | None
+    migration_head: str | None
+
+
 # JSON payload containing access token
 class Token(SQLModel):
     access_token: str
@@ -0,0 +1,79 @@
+from typing import Literal
+
+from sqlalchemy import text
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.model.users import Item, User
+
+CountMode = Literal["exact", "estimate", "none"]
+
+# Keyed by (table name, owner id), owner id None is the table-wide total
+count_cache: TTLCache[tuple[str, int | None], int] = TTLCache(
+    maxsize=settings.COUNT_CACHE_MAX_SIZE, ttl=settings.COUNT_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_item_count(owner_id: int | None) -> None:
+    count_cache.delete(("item", owner_id))
+    count_cache.delete(("item", None))
+
+
+def invalidate_user_count() -> None:
+    count_cache.delete(("user", None))
+
+
+async def _exact_count(
+    session: AsyncSession,
+    key: tuple[str, int | None],
+    statement: SelectOfScalar[int],
+) -> int:
+    count = count_cache.get(key)
+    if count is None:
+        count = (await session.exec(statement)).one()
+        count_cache.set(key, count)
+    return count
+
+
+async def _estimated_count(session: AsyncSession, table_name: str) -> int | None:
+    # Planner statistics, maintained by ANALYZE and autovacuum
+    statement = text(
+        "SELECT reltuples::bigint FROM pg_class "
+        "WHERE relname = :table_name AND relkind = 'r' "
+        "AND relnamespace = current_schema()::regnamespace"
+    )
+    result = await session.execute(statement, {"table_name": table_name})
+    reltuples = result.scalar()
+    # -1 means the table has never been analyzed
+    if reltuples is None or reltuples < 0:
+        return None
+    return int(reltuples)
+
+
+async def count_items(
+    *, session: AsyncSession, owner_id: int | None, mode: CountMode
+) -> int | None:
+    if mode == "none":
+        return None
+    if mode == "estimate" and owner_id is None:
+        estimate = await _estimated_count(session, "item")
+        if estimate is not None:
+            return estimate
+    statement = select(func.count()).select_from(Item)
+    if owner_id is not None:
+        statement = statement.where(Item.owner_id == owner_id)
+    return await _exact_count(session, ("item", owner_id), statement)
+
+
+async def count_users(*, session: AsyncSession, mode: CountMode) -> int | None:
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        estimate = await _estimated_count(session, "user")
+        if estimate is not None:
+            return estimate
+    statement = select(func.count()).select_from(User)
+    return await _exact_count(session, ("user", None), statement)
@@ -0,0 +1,117 @@
+from datetime import datetime
+
+from sqlalchemy import any_, literal, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, delete, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.model.users import Item, User, UserDeletion
+from app.repository.item_cache import invalidate_cached_items
+from app.repository.users import invalidate_cached_user
+
+
+async def schedule_user_deletion_async(
+    *, session: AsyncSession, user_id: int
+) -> UserDeletion | None:
+    """
+    Deactivate the user right away and record the deletion for the purge
+    worker, scheduling an already scheduled deletion again is a no-op.
+    Returns None if there is no such user.
+    """
+    # A single statement: the user is deactivated in a CTE of the INSERT,
+    # which inserts nothing if no user matched
+    deactivated = (
+        update(User)
+        .where(col(User.id) == user_id)
+        .values(is_active=False, version=col(User.version) + 1)
+        .returning(col(User.id))
+        .cte("deactivated")
+    )
+    now = datetime.utcnow()
+    rows = deactivated.select().with_only_columns(
+        deactivated.c.id, literal("pending"), literal(0), literal(now), literal(now)
+    )
+    columns = ["user_id", "status", "items_deleted", "created_at", "updated_at"]
+    statement = (
+        insert(UserDeletion)
+        .from_select(columns, rows)
+        .add_cte(deactivated)
+        # Updating the key to itself returns the existing row, DO NOTHING
+        # wouldn't return it
+        .on_conflict_do_update(
+            index_elements=[col(UserDeletion.user_id)],
+            set_={"user_id": col(UserDeletion.user_id)},
+        )
+        .returning(UserDeletion)
+        .execution_options(populate_existing=True)
+    )
+    deletion = (await session.scalars(statement)).one_or_none()
+    await session.commit()
+    invalidate_cached_user(user_id)
+    return deletion
+
+
+async def get_user_deletion_async(
+    *, session: AsyncSession, user_id: int
+) -> UserDeletion | None:
+    return await session.get(UserDeletion, user_id)
+
+
+async def purge_next_chunk_async(
+    *, session: AsyncSession, chunk_size: int
+) -> UserDeletion | None:
+    """
+    Delete up to `chunk_size` items of an unfinished deletion in one
+    transaction, and the user with the last chunk. Cached copies of the
+    deleted items are invalidated. Returns the deletion worked on, or None
+    when there is nothing left to purge.
+    """
+    # SKIP LOCKED lets the workers of several processes purge side by side
+    statement = (
+        select(UserDeletion)
+        .where(UserDeletion.status != "completed")
+        .order_by(col(UserDeletion.created_at))
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    deletion = (await session.exec(statement)).first()
+    if deletion is None:
+        await session.rollback()
+        return None
+
+    if deletion.items_total is None:
+        count_statement = (
+            select(func.count())
+            .select_from(Item)
+            .where(Item.owner_id == deletion.user_id)
+        )
+        deletion.items_total = (await session.exec(count_statement)).one()
+        deletion.status = "running"
+
+    # Ids come from the (owner_id, id) index, and = ANY(ARRAY(...)) keeps the
+    # delete itself on the primary key whatever the table statistics say
+    chunk = (
+        select(Item.id)
+        .where(Item.owner_id == deletion.user_id)
+        .order_by(col(Item.id))
+        .limit(chunk_size)
+    )
+    purge = (
+        delete(Item)
+        .where(col(Item.id) == any_(func.array(chunk.scalar_subquery())))
+        .returning(col(Item.id))
+        .execution_options(synchronize_session=False)
+    )
+    deleted_ids = list((await session.execute(purge)).scalars())
+    deleted = len(deleted_ids)
+    deletion.items_deleted += deleted
+    deletion.updated_at = datetime.utcnow()
+    if deleted < chunk_size:
+        await session.exec(delete(User).where(col(User.id) == deletion.user_id))  # type: ignore
+        deletion.status = "completed"
+        deletion.finished_at = deletion.updated_at
+    user_id = deletion.user_id
+    session.add(deletion)
+    await session.commit()
+    await invalidate_cached_items(user_id, deleted_ids)
+    return deletion
@@ -0,0 +1,67 @@
+from typing import Any
+
+import orjson
+
+from app.core.cache import create_cache
+from app.core.config import settings
+
+# ItemOut by id and the first ItemsOut page per owner, each stored as JSON
+# along with its ETag
+item_cache = create_cache()
+
+
+def _item_key(item_id: int) -> str:
+    return f"item:{item_id}"
+
+
+def _first_page_key(owner_id: int | None) -> str:
+    # Owner id None is the first page of all items, as listed to superusers
+    return f"items:first-page:{'all' if owner_id is None else owner_id}"
+
+
+async def _get(key: str) -> dict[str, Any] | None:
+    value = await item_cache.get(key)
+    if value is None:
+        return None
+    entry: dict[str, Any] = orjson.loads(value)
+    return entry
+
+
+async def _add(key: str, entry: dict[str, Any]) -> None:
+    await item_cache.add(key, orjson.dumps(entry), settings.CACHE_TTL_SECONDS)
+
+
+async def get_cached_item(item_id: int) -> dict[str, Any] | None:
+    return await _get(_item_key(item_id))
+
+
+async def cache_item(item_id: int, *, item: dict[str, Any], etag: str) -> None:
+    await _add(_item_key(item_id), {"item": item, "etag": etag})
+
+
+async def get_cached_first_page(owner_id: int | None) -> dict[str, Any] | None:
+    return await _get(_first_page_key(owner_id))
+
+
+async def cache_first_page(
+    owner_id: int | None, *, page: dict[str, Any], etag: str
+) -> None:
+    await _add(_first_page_key(owner_id), {"page": page, "etag": etag})
+
+
+async def invalidate_cached_items(
+    owner_id: int | None, item_ids: list[int | None] | None = None
+) -> None:
+    keys = [_first_page_key(owner_id), _first_page_key(None)]
+    keys += [_item_key(item_id) for item_id in item_ids or [] if item_id is not None]
+    await item_cache.invalidate(*keys)
+
+
+async def get_item_cache_stats() -> dict[str, Any]:
+    return {
+        "backend": item_cache.name,
+        "hits": item_cache.hits,
+        "misses": item_cache.misses,
+        "hit_ratio": item_cache.hit_ratio,
+        "memory_bytes": await item_cache.memory_bytes(),
+    }
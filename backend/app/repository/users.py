@@ -1,9 +1,42 @@
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import delete, exists, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.model.users import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    get_password_hashes_async,
+    verify_password,
+    verify_password_async,
+)
+from app.model.users import (
+    Item,
+    ItemCreate,
+    ItemUpdate,
+    User,
+    UserCreate,
+    UserDeletion,
+    UserUpdate,
+    UserUpdateMe,
+)
+from app.repository.counts import invalidate_item_count, invalidate_user_count
+
+# Column values of active users, keyed by user id
+user_cache: TTLCache[int, dict[str, Any]] = TTLCache(
+    maxsize=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_cached_user(user_id: int | None) -> None:
+    if user_id is not None:
+        user_cache.delete(user_id)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -13,20 +46,49 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     session.add(db_obj)
     session.commit()
     session.refresh(db_obj)
+    invalidate_user_count()
     return db_obj
 
 
-def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
+def _update_user_statement(
+    user_id: int, user_data: dict[str, Any], hashed_password: str | None
+) -> Any:
+    # A single UPDATE ... RETURNING, the returned row also refreshes the user
+    # instance in the session, if any
+    user_data.pop("password", None)
+    if hashed_password is not None:
+        user_data["hashed_password"] = hashed_password
+    # A user whose deletion is under way stays as it is, reactivating it would
+    # let it log in while the purge deletes its items and then the user
+    being_deleted = exists().where(
+        col(UserDeletion.user_id) == user_id, col(UserDeletion.status) != "completed"
+    )
+    return (
+        update(User)
+        .where(col(User.id) == user_id, ~being_deleted)
+        .values(user_data | {"version": col(User.version) + 1})
+        .returning(User)
+        .execution_options(populate_existing=True)
+    )
+
+
+def update_user(*, session: Session, user_id: int, user_in: UserUpdate) -> User | None:
+    """
+    Update the user, return None if there is no such user or it is being
+    deleted. Raises IntegrityError if the email is taken by another user.
+    """
     user_data = user_in.model_dump(exclude_unset=True)
-    extra_data = {}
-    if "password" in user_data:
-        password = user_data["password"]
-        hashed_password = get_password_hash(password)
-        extra_data["hashed_password"] = hashed_password
-    db_user.sqlmodel_update(user_data, update=extra_data)
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+    hashed_password = None
+    if user_data.get("password"):
+        hashed_password = get_password_hash(user_data["password"])
+    statement = _update_user_statement(user_id, user_data, hashed_password)
+    try:
+        db_user = session.scalars(statement).one_or_none()
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise
+    invalidate_cached_user(user_id)
     return db_user
 
 
@@ -50,4 +112,250 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: int) -> Item
     session.add(db_item)
     session.commit()
     session.refresh(db_item)
+    invalidate_item_count(owner_id)
     return db_item
+
+
+def create_items(
+    *, session: Session, items_in: list[ItemCreate], owner_id: int
+) -> list[Item]:
+    if not items_in:
+        return []
+    # Sent as multi-row INSERT ... VALUES ... RETURNING statements, the rows
+    # come back in the order of items_in
+    values = [item_in.model_dump() | {"owner_id": owner_id} for item_in in items_in]
+    statement = insert(Item).returning(Item, sort_by_parameter_order=True)
+    db_items = list(session.scalars(statement, values))
+    session.commit()
+    invalidate_item_count(owner_id)
+    return db_items
+
+
+async def create_user_async(
+    *, session: AsyncSession, user_create: UserCreate
+) -> User | None:
+    """
+    Create the user, return None if the email is taken.
+    """
+    hashed_password = await get_password_hash_async(user_create.password)
+    values = user_create.model_dump(exclude={"password"})
+    # A single INSERT ... RETURNING, the unique email index answers whether
+    # the user exists instead of a SELECT beforehand
+    statement = (
+        insert(User)
+        .values(values | {"hashed_password": hashed_password})
+        .on_conflict_do_nothing(index_elements=[col(User.email)])
+        .returning(User)
+    )
+    db_user = (await session.scalars(statement)).one_or_none()
+    await session.commit()
+    if db_user is not None:
+        invalidate_user_count()
+    return db_user
+
+
+async def update_user_async(
+    *, session: AsyncSession, user_id: int, user_in: UserUpdate | UserUpdateMe
+) -> User | None:
+    """
+    Update the user, return None if there is no such user or it is being
+    deleted. Raises IntegrityError if the email is taken by another user.
+    """
+    user_data = user_in.model_dump(exclude_unset=True)
+    hashed_password = None
+    if user_data.get("password"):
+        hashed_password = await get_password_hash_async(user_data["password"])
+    statement = _update_user_statement(user_id, user_data, hashed_password)
+    try:
+        db_user = (await session.scalars(statement)).one_or_none()
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise
+    invalidate_cached_user(user_id)
+    return db_user
+
+
+async def update_password_async(
+    *, session: AsyncSession, user_id: int, password: str
+) -> User | None:
+    """
+    Set the user's password, return None if there is no such user or it is
+    being deleted.
+    """
+    hashed_password = await get_password_hash_async(password)
+    statement = _update_user_statement(user_id, {}, hashed_password)
+    db_user = (await session.scalars(statement)).one_or_none()
+    await session.commit()
+    invalidate_cached_user(user_id)
+    return db_user
+
+
+async def get_user_cached(*, session: AsyncSession, user_id: int) -> User | None:
+    cached = user_cache.get(user_id)
+    if cached is None:
+        db_user = await session.get(User, user_id)
+        if db_user and db_user.is_active:
+            user_cache.set(user_id, db_user.model_dump())
+        return db_user
+    # Attach a fresh instance as persistent without loading it, so routes can
+    # still modify and commit the current user through the session
+    db_user = User(**cached)
+    make_transient_to_detached(db_user)
+    session.add(db_user)
+    return db_user
+
+
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        return None
+    if not await verify_password_async(password, db_user.hashed_password):
+        return None
+    return db_user
+
+
+async def create_item_async(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: int
+) -> Item:
+    # INSERT ... RETURNING, no refresh afterwards
+    statement = (
+        insert(Item)
+        .values(item_in.model_dump() | {"owner_id": owner_id})
+        .returning(Item)
+    )
+    db_item = (await session.scalars(statement)).one()
+    await session.commit()
+    invalidate_item_count(owner_id)
+    return db_item
+
+
+async def update_item_async(
+    *, session: AsyncSession, item_id: int, item_in: ItemUpdate, owner_id: int | None
+) -> Item | None:
+    """
+    Update the item in a single UPDATE ... RETURNING. With an owner_id, only
+    an item of that owner is updated. Returns None if no item matched.
+    """
+    statement = update(Item).where(col(Item.id) == item_id)
+    if owner_id is not None:
+        statement = statement.where(col(Item.owner_id) == owner_id)
+    values = item_in.model_dump(exclude_unset=True)
+    statement = (
+        statement.values(values | {"version": col(Item.version) + 1})
+        .returning(Item)
+        .execution_options(populate_existing=True)
+    )
+    db_item = (await session.scalars(statement)).one_or_none()
+    await session.commit()
+    return db_item
+
+
+async def delete_item_async(
+    *, session: AsyncSession, item_id: int, owner_id: int | None
+) -> int | None:
+    """
+    Delete the item in a single DELETE ... RETURNING. With an owner_id, only
+    an item of that owner is deleted. Returns the owner of the deleted item,
+    or None if no item matched.
+    """
+    statement = delete(Item).where(col(Item.id) == item_id)
+    if owner_id is not None:
+        statement = statement.where(col(Item.owner_id) == owner_id)
+    deleted_owner_id = await session.scalar(statement.returning(col(Item.owner_id)))
+    await session.commit()
+    if deleted_owner_id is not None:
+        invalidate_item_count(deleted_owner_id)
+    return deleted_owner_id
+
+
+async def create_items_async(
+    *, session: AsyncSession, items_in: list[ItemCreate], owner_id: int
+) -> list[Item]:
+    if not items_in:
+        return []
+    values = [item_in.model_dump() | {"owner_id": owner_id} for item_in in items_in]
+    statement = insert(Item).returning(Item, sort_by_parameter_order=True)
+    db_items = list(await session.scalars(statement, values))
+    await session.commit()
+    invalidate_item_count(owner_id)
+    return db_items
+
+
+async def import_users_async(
+    *, session: AsyncSession, users_in: list[UserCreate]
+) -> list[str | None]:
+    """
+    Insert a batch of users with COPY, return an error message or None per user.
+    """
+    emails = [user_in.email for user_in in users_in]
+    statement = select(User.email).where(col(User.email).in_(emails))
+    existing = set((await session.exec(statement)).all())
+    new_users = [user_in for user_in in users_in if user_in.email not in existing]
+    created: set[str] = set()
+    if new_users:
+        created = await _copy_users(session=session, users_in=new_users)
+    return [
+        None
+        if user_in.email in created
+        else "The user with this email already exists in the system."
+        for user_in in users_in
+    ]
+
+
+async def _copy_users(*, session: AsyncSession, users_in: list[UserCreate]) -> set[str]:
+    hashed_passwords = await get_password_hashes_async(
+        [user_in.password for user_in in users_in]
+    )
+
+    await session.execute(
+        text(
+            "CREATE TEMP TABLE IF NOT EXISTS user_import "
+            "(email varchar NOT NULL, hashed_password varchar NOT NULL, "
+            "full_name varchar, is_active boolean NOT NULL, "
+            "is_superuser boolean NOT NULL) ON COMMIT DELETE ROWS"
+        )
+    )
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    # COPY is only exposed by the psycopg connection itself
+    driver_connection = raw_connection.driver_connection
+    assert driver_connection is not None
+    async with driver_connection.cursor() as cursor:
+        async with cursor.copy(
+            "COPY user_import (email, hashed_password, full_name, is_active, "
+            "is_superuser) FROM STDIN"
+        ) as copy:
+            for user_in, hashed_password in zip(
+                users_in, hashed_passwords, strict=True
+            ):
+                await copy.write_row(
+                    (
+                        user_in.email,
+                        hashed_password,
+                        user_in.full_name,
+                        user_in.is_active,
+                        user_in.is_superuser,
+                    )
+                )
+    # Rows inserted concurrently since the lookup above are skipped, not fatal
+    result = await session.execute(
+        text(
+            'INSERT INTO "user" '
+            "(email, hashed_password, full_name, is_active, is_superuser) "
+            "SELECT email, hashed_password, full_name, is_active, is_superuser "
+            "FROM user_import ON CONFLICT (email) DO NOTHING RETURNING email"
+        )
+    )
+    created = set(result.scalars())
+    await session.commit()
+    invalidate_user_count()
+    return created
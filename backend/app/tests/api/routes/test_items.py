@@ -1,19 +1,32 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from sqlmodel import Session
 
 from app.core.config import settings
 from app.tests.utils.item import create_random_item
+from app.tests.utils.queries import MaxQueries
+from app.tests.utils.utils import random_lower_string
+from app.utils import encode_cursor
 
 
 def test_create_item(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     data = {"title": "Foo", "description": "Fighters"}
-    response = client.post(
-        f"{settings.API_V1_STR}/items/",
-        headers=superuser_token_headers,
-        json=data,
-    )
+    with assert_max_queries(2):
+        response = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            json=data,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == data["title"]
@@ -22,22 +35,211 @@ def test_create_item(
     assert "owner_id" in content
 
 
-def test_read_item(
+def test_create_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    data = [{"title": f"Bulk {i}", "description": "Imported"} for i in range(50)]
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [item["title"] for item in content] == [item["title"] for item in data]
+    assert len({item["id"] for item in content}) == len(data)
+    assert len({item["owner_id"] for item in content}) == 1
+
+
+def test_create_items_bulk_too_many(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    data = [{"title": "Foo"}] * 3
+    with patch("app.core.config.settings.ITEMS_BULK_MAX_SIZE", 2):
+        response = client.post(
+            f"{settings.API_V1_STR}/items/bulk",
+            headers=superuser_token_headers,
+            json=data,
+        )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Too many items, the maximum is 2"
+
+
+def test_export_items_ndjson(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     item = create_random_item(db)
     response = client.get(
-        f"{settings.API_V1_STR}/items/{item.id}",
+        f"{settings.API_V1_STR}/items/export", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert {
+        "id": item.id,
+        "title": item.title,
+        "description": item.description,
+        "owner_id": item.owner_id,
+    } in rows
+
+
+def test_export_items_csv_only_own_items(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        json={"title": "Exported"},
+    )
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=normal_user_token_headers,
+        params={"format": "csv"},
+    )
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert rows
+    assert len({row["owner_id"] for row in rows}) == 1
+    assert "Exported" in {row["title"] for row in rows}
+
+
+def test_search_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    word = random_lower_string()
+    titles = [f"{word} {word}", f"{word} other", f"{word} third"]
+    for title in titles:
+        client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            json={"title": title, "description": "searchable"},
+        )
+    create_random_item(db)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
         headers=superuser_token_headers,
+        params={"q": word, "limit": 2},
+    )
+    assert response.status_code == 200
+    first_page = response.json()
+    assert [item["title"] for item in first_page["data"]][0] == titles[0]
+    assert first_page["next_cursor"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": word, "limit": 2, "cursor": first_page["next_cursor"]},
+    )
+    second_page = response.json()
+    found = [item["title"] for item in first_page["data"] + second_page["data"]]
+    assert sorted(found) == sorted(titles)
+    assert second_page["next_cursor"] is None
+
+
+def test_search_items_limit_zero(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    word = random_lower_string()
+    client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        json={"title": word},
+    )
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": word, "limit": 0},
     )
     assert response.status_code == 200
     content = response.json()
+    assert content["data"] == []
+    assert content["next_cursor"] is None
+
+
+def test_search_items_only_own_items(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=normal_user_token_headers,
+        params={"q": item.title},
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == []
+
+
+def test_read_item(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
+) -> None:
+    item = create_random_item(db)
+    with assert_max_queries(2):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+        )
+    assert response.status_code == 200
+    content = response.json()
     assert content["title"] == item.title
     assert content["description"] == item.description
     assert content["id"] == item.id
     assert content["owner_id"] == item.owner_id
 
 
+def test_read_item_not_modified(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    response = client.get(url, headers=superuser_token_headers)
+    etag = response.headers["etag"]
+    assert not etag.startswith("W/")
+
+    headers = superuser_token_headers | {"If-None-Match": etag}
+    response = client.get(url, headers=headers)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    client.put(url, headers=superuser_token_headers, json={"title": "Changed"})
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Changed"
+    assert response.headers["etag"] != etag
+
+
+def test_read_item_cached(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    response = client.get(url, headers=superuser_token_headers)
+    with assert_max_queries(0):
+        cached = client.get(url, headers=superuser_token_headers)
+    assert cached.json() == response.json()
+    assert cached.headers["etag"] == response.headers["etag"]
+    # Permissions are checked on cached items too
+    response = client.get(url, headers=normal_user_token_headers)
+    assert response.status_code == 400
+
+    client.put(url, headers=superuser_token_headers, json={"title": "Changed"})
+    response = client.get(url, headers=superuser_token_headers)
+    assert response.json()["title"] == "Changed"
+    client.delete(url, headers=superuser_token_headers)
+    response = client.get(url, headers=superuser_token_headers)
+    assert response.status_code == 404
+
+
 def test_read_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -64,29 +266,191 @@ def test_read_item_not_enough_permissions(
 
 
 def test_read_items(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     create_random_item(db)
+    create_random_item(db)
+    with assert_max_queries(3):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+        )
+    assert response.status_code == 200
+    content = response.json()
+    assert len(content["data"]) >= 2
+
+
+def test_read_items_not_modified(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    etag = client.get(url, headers=superuser_token_headers).headers["etag"]
+    headers = superuser_token_headers | {"If-None-Match": f'"other", {etag}'}
+    response = client.get(url, headers=headers)
+    assert response.status_code == 304
+
+    client.post(url, headers=superuser_token_headers, json={"title": "New"})
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_read_items_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"limit": 2},
+    )
+    first_page = response.json()
+    assert len(first_page["data"]) == 2
+    assert first_page["next_cursor"]
+
+    seen_ids = [item["id"] for item in first_page["data"]]
+    cursor = first_page["next_cursor"]
+    while cursor:
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params={"limit": 2, "cursor": cursor},
+        )
+        assert response.status_code == 200
+        content = response.json()
+        seen_ids.extend(item["id"] for item in content["data"])
+        cursor = content["next_cursor"]
+    assert seen_ids == sorted(seen_ids)
+    assert len(seen_ids) == first_page["count"]
+
+
+def test_read_items_limit_zero(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
     create_random_item(db)
     response = client.get(
         f"{settings.API_V1_STR}/items/",
         headers=superuser_token_headers,
+        params={"limit": 0},
     )
     assert response.status_code == 200
     content = response.json()
-    assert len(content["data"]) >= 2
+    assert content["data"] == []
+    assert content["next_cursor"] is None
 
 
-def test_update_item(
+def test_read_items_cursor_only_own_items(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"cursor": encode_cursor([0])},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert len(content["data"]) == content["count"]
+
+
+def test_read_items_count_modes(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
-    item = create_random_item(db)
-    data = {"title": "Updated title", "description": "Updated description"}
-    response = client.put(
-        f"{settings.API_V1_STR}/items/{item.id}",
+    create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/"
+    response = client.get(url, headers=superuser_token_headers)
+    exact = response.json()["count"]
+    assert exact >= 1
+
+    response = client.get(
+        url, headers=superuser_token_headers, params={"count": "none"}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] is None
+
+    db.execute(text("ANALYZE item"))
+    response = client.get(
+        url, headers=superuser_token_headers, params={"count": "estimate"}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] >= 0
+
+
+def test_read_items_count_invalidated_on_write(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    count = client.get(url, headers=superuser_token_headers).json()["count"]
+    response = client.post(
+        url, headers=superuser_token_headers, json={"title": "Counted"}
+    )
+    item_id = response.json()["id"]
+    assert client.get(url, headers=superuser_token_headers).json()["count"] == count + 1
+    client.delete(f"{url}{item_id}", headers=superuser_token_headers)
+    assert client.get(url, headers=superuser_token_headers).json()["count"] == count
+
+
+def test_read_items_first_page_cached(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+    assert_max_queries: MaxQueries,
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    response = client.get(url, headers=normal_user_token_headers)
+    all_items = client.get(url, headers=superuser_token_headers)
+    with assert_max_queries(0):
+        cached = client.get(url, headers=normal_user_token_headers)
+    assert cached.json() == response.json()
+    assert cached.headers["etag"] == response.headers["etag"]
+    # Other pages are not cached
+    with assert_max_queries(1):
+        client.get(url, headers=normal_user_token_headers, params={"limit": 10})
+
+    # Writes of the owner invalidate their page and the page of all items
+    response = client.post(
+        url, headers=normal_user_token_headers, json={"title": "Cached"}
+    )
+    item_id = response.json()["id"]
+    response = client.get(url, headers=normal_user_token_headers)
+    assert response.json()["count"] == cached.json()["count"] + 1
+    response = client.get(url, headers=superuser_token_headers)
+    assert response.json()["count"] == all_items.json()["count"] + 1
+    client.delete(f"{url}{item_id}", headers=normal_user_token_headers)
+    response = client.get(url, headers=normal_user_token_headers)
+    assert response.json()["count"] == cached.json()["count"]
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
         headers=superuser_token_headers,
-        json=data,
+        params={"cursor": "not-a-cursor"},
     )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_update_item(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
+) -> None:
+    item = create_random_item(db)
+    data = {"title": "Updated title", "description": "Updated description"}
+    with assert_max_queries(2):
+        response = client.put(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+            json=data,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == data["title"]
@@ -125,13 +489,17 @@ def test_update_item_not_enough_permissions(
 
 
 def test_delete_item(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     item = create_random_item(db)
-    response = client.delete(
-        f"{settings.API_V1_STR}/items/{item.id}",
-        headers=superuser_token_headers,
-    )
+    with assert_max_queries(2):
+        response = client.delete(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["message"] == "Item deleted successfully"
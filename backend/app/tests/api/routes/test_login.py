@@ -1,17 +1,19 @@
-from unittest.mock import patch
-
 from fastapi.testclient import TestClient
 
 from app.core.config import settings
+from app.core.mail import mail_dispatcher
+from app.tests.utils.queries import MaxQueries
+from app.tests.utils.smtp import DebuggingHandler
 from app.utils import generate_password_reset_token
 
 
-def test_get_access_token(client: TestClient) -> None:
+def test_get_access_token(client: TestClient, assert_max_queries: MaxQueries) -> None:
     login_data = {
         "username": settings.FIRST_SUPERUSER,
         "password": settings.FIRST_SUPERUSER_PASSWORD,
     }
-    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    with assert_max_queries(1):
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
     tokens = r.json()
     assert r.status_code == 200
     assert "access_token" in tokens
@@ -40,18 +42,20 @@ def test_use_access_token(
 
 
 def test_recovery_password(
-    client: TestClient, normal_user_token_headers: dict[str, str]
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    smtp_server: DebuggingHandler,
 ) -> None:
-    with patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"), patch(
-        "app.core.config.settings.SMTP_USER", "admin@example.com"
-    ):
-        email = "test@example.com"
-        r = client.post(
-            f"{settings.API_V1_STR}/password-recovery/{email}",
-            headers=normal_user_token_headers,
-        )
-        assert r.status_code == 200
-        assert r.json() == {"message": "Password recovery email sent"}
+    email = "test@example.com"
+    r = client.post(
+        f"{settings.API_V1_STR}/password-recovery/{email}",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json() == {"message": "Password recovery email sent"}
+
+    client.portal.call(mail_dispatcher.join)  # type: ignore[union-attr]
+    assert [message["To"] for message in smtp_server.messages] == [email]
 
 
 def test_recovery_password_user_not_exits(
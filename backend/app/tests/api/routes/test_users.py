@@ -1,18 +1,28 @@
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select
 
 from app.core.config import settings
-from app.model.users import UserCreate
+from app.core.mail import mail_dispatcher
+from app.core.purge import user_purger
+from app.model.users import ItemCreate, User, UserCreate, UserDeletion
 from app.repository import users
+from app.tests.utils.queries import MaxQueries
+from app.tests.utils.smtp import DebuggingHandler
+from app.tests.utils.user import user_authentication_headers
 from app.tests.utils.utils import random_email, random_lower_string
 
 
 def test_get_users_superuser_me(
-    client: TestClient, superuser_token_headers: dict[str, str]
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    assert_max_queries: MaxQueries,
 ) -> None:
-    r = client.get(f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers)
+    with assert_max_queries(1):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers
+        )
     current_user = r.json()
     assert current_user
     assert current_user["is_active"] is True
@@ -32,38 +42,47 @@ def test_get_users_normal_user_me(
 
 
 def test_create_user_new_email(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    smtp_server: DebuggingHandler,
+    assert_max_queries: MaxQueries,
 ) -> None:
-    with patch("app.utils.send_email", return_value=None), patch(
-        "app.core.config.settings.SMTP_HOST", "smtp.example.com"
-    ), patch("app.core.config.settings.SMTP_USER", "admin@example.com"):
-        username = random_email()
-        password = random_lower_string()
-        data = {"email": username, "password": password}
+    username = random_email()
+    password = random_lower_string()
+    data = {"email": username, "password": password}
+    with assert_max_queries(1):
         r = client.post(
             f"{settings.API_V1_STR}/users/",
             headers=superuser_token_headers,
             json=data,
         )
-        assert 200 <= r.status_code < 300
-        created_user = r.json()
-        user = users.get_user_by_email(session=db, email=username)
-        assert user
-        assert user.email == created_user["email"]
+    assert 200 <= r.status_code < 300
+    created_user = r.json()
+    user = users.get_user_by_email(session=db, email=username)
+    assert user
+    assert user.email == created_user["email"]
+
+    client.portal.call(mail_dispatcher.join)  # type: ignore[union-attr]
+    assert [message["To"] for message in smtp_server.messages] == [username]
 
 
 def test_get_existing_user(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = users.create_user(session=db, user_create=user_in)
     user_id = user.id
-    r = client.get(
-        f"{settings.API_V1_STR}/users/{user_id}",
-        headers=superuser_token_headers,
-    )
+    with assert_max_queries(2):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/{user_id}",
+            headers=superuser_token_headers,
+        )
     assert 200 <= r.status_code < 300
     api_user = r.json()
     existing_user = users.get_user_by_email(session=db, email=username)
@@ -110,7 +129,10 @@ def test_get_existing_user_permissions_error(
 
 
 def test_create_user_existing_username(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     username = random_email()
     # username = email
@@ -118,11 +140,12 @@ def test_create_user_existing_username(
     user_in = UserCreate(email=username, password=password)
     users.create_user(session=db, user_create=user_in)
     data = {"email": username, "password": password}
-    r = client.post(
-        f"{settings.API_V1_STR}/users/",
-        headers=superuser_token_headers,
-        json=data,
-    )
+    with assert_max_queries(1):
+        r = client.post(
+            f"{settings.API_V1_STR}/users/",
+            headers=superuser_token_headers,
+            json=data,
+        )
     created_user = r.json()
     assert r.status_code == 400
     assert "_id" not in created_user
@@ -143,7 +166,10 @@ def test_create_user_by_normal_user(
 
 
 def test_retrieve_users(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     username = random_email()
     password = random_lower_string()
@@ -155,7 +181,8 @@ def test_retrieve_users(
     user_in2 = UserCreate(email=username2, password=password2)
     users.create_user(session=db, user_create=user_in2)
 
-    r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
+    with assert_max_queries(3):
+        r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
     all_users = r.json()
 
     assert len(all_users["data"]) > 1
@@ -164,17 +191,122 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_limit_zero(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 0},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["data"] == []
+    assert content["next_cursor"] is None
+
+
+def test_retrieve_users_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        user_in = UserCreate(email=random_email(), password=random_lower_string())
+        users.create_user(session=db, user_create=user_in)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2},
+    )
+    first_page = r.json()
+    assert len(first_page["data"]) == 2
+    assert first_page["next_cursor"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2, "cursor": first_page["next_cursor"]},
+    )
+    assert r.status_code == 200
+    second_page = r.json()
+    first_ids = [user["id"] for user in first_page["data"]]
+    second_ids = [user["id"] for user in second_page["data"]]
+    assert second_ids
+    assert min(second_ids) > max(first_ids)
+
+
+def test_import_users(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    existing_email = random_email()
+    users.create_user(
+        session=db,
+        user_create=UserCreate(email=existing_email, password=random_lower_string()),
+    )
+    new_emails = [random_email() for _ in range(3)]
+    lines = ["email,password,full_name"]
+    lines += [f"{email},{random_lower_string()},Imported" for email in new_emails]
+    lines += [
+        f"{new_emails[0]},{random_lower_string()},",
+        f"{existing_email},{random_lower_string()},",
+        f"{random_email()},,",
+    ]
+    csv_content = "\n".join(lines).encode()
+
+    with patch("app.core.config.settings.USERS_IMPORT_BATCH_SIZE", 2):
+        r = client.post(
+            f"{settings.API_V1_STR}/users/import",
+            headers=superuser_token_headers,
+            files={"file": ("users.csv", csv_content, "text/csv")},
+        )
+    assert r.status_code == 200
+    result = r.json()
+    assert result["created"] == 3
+    assert [error["row"] for error in result["errors"]] == [4, 5, 6]
+    assert result["errors"][0]["error"] == "Duplicate email in the file"
+    for email in new_emails:
+        user = users.get_user_by_email(session=db, email=email)
+        assert user
+        assert user.full_name == "Imported"
+
+
+def test_import_users_missing_columns(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/users/import",
+        headers=superuser_token_headers,
+        files={"file": ("users.csv", b"email\nfoo@example.com", "text/csv")},
+    )
+    assert r.status_code == 400
+    assert r.json() == {"detail": "The CSV file must have email and password columns"}
+
+
+def test_import_users_by_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/users/import",
+        headers=normal_user_token_headers,
+        files={"file": ("users.csv", b"email,password\n", "text/csv")},
+    )
+    assert r.status_code == 400
+
+
 def test_update_user_me(
-    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     full_name = "Updated Name"
     email = random_email()
     data = {"full_name": full_name, "email": email}
-    r = client.patch(
-        f"{settings.API_V1_STR}/users/me",
-        headers=normal_user_token_headers,
-        json=data,
-    )
+    with assert_max_queries(2):
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/me",
+            headers=normal_user_token_headers,
+            json=data,
+        )
     assert r.status_code == 200
     updated_user = r.json()
     assert updated_user["email"] == email
@@ -182,18 +314,22 @@ def test_update_user_me(
 
 
 def test_update_password_me(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     new_password = random_lower_string()
     data = {
         "current_password": settings.FIRST_SUPERUSER_PASSWORD,
         "new_password": new_password,
     }
-    r = client.patch(
-        f"{settings.API_V1_STR}/users/me/password",
-        headers=superuser_token_headers,
-        json=data,
-    )
+    with assert_max_queries(1):
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/me/password",
+            headers=superuser_token_headers,
+            json=data,
+        )
     assert r.status_code == 200
     updated_user = r.json()
     assert updated_user["message"] == "Password updated successfully"
@@ -263,16 +399,17 @@ def test_update_password_me_same_password_error(
     )
 
 
-def test_create_user_open(client: TestClient) -> None:
+def test_create_user_open(client: TestClient, assert_max_queries: MaxQueries) -> None:
     with patch("app.core.config.settings.USERS_OPEN_REGISTRATION", True):
         username = random_email()
         password = random_lower_string()
         full_name = random_lower_string()
         data = {"email": username, "password": password, "full_name": full_name}
-        r = client.post(
-            f"{settings.API_V1_STR}/users/open",
-            json=data,
-        )
+        with assert_max_queries(1):
+            r = client.post(
+                f"{settings.API_V1_STR}/users/open",
+                json=data,
+            )
         assert r.status_code == 200
         created_user = r.json()
         assert created_user["email"] == username
@@ -316,7 +453,10 @@ def test_create_user_open_already_exists_error(client: TestClient) -> None:
 
 
 def test_update_user(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     username = random_email()
     password = random_lower_string()
@@ -324,14 +464,87 @@ def test_update_user(
     user = users.create_user(session=db, user_create=user_in)
 
     data = {"full_name": "Updated_full_name"}
+    with assert_max_queries(2):
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/{user.id}",
+            headers=superuser_token_headers,
+            json=data,
+        )
+    assert r.status_code == 200
+    updated_user = r.json()
+    assert updated_user["full_name"] == "Updated_full_name"
+
+
+def test_current_user_is_cached(client: TestClient, db: Session) -> None:
+    username = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=username, password=password)
+    users.create_user(session=db, user_create=user_in)
+    headers = user_authentication_headers(
+        client=client, email=username, password=password
+    )
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    hits = users.user_cache.hits
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    assert users.user_cache.hits == hits + 1
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=headers,
+        json={"full_name": "Cached Name"},
+    )
+    assert r.status_code == 200
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.json()["full_name"] == "Cached Name"
+
+
+def test_read_user_me_not_modified(client: TestClient, db: Session) -> None:
+    username = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=username, password=password)
+    users.create_user(session=db, user_create=user_in)
+    headers = user_authentication_headers(
+        client=client, email=username, password=password
+    )
+
+    url = f"{settings.API_V1_STR}/users/me"
+    etag = client.get(url, headers=headers).headers["etag"]
+    r = client.get(url, headers=headers | {"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+
+    client.patch(url, headers=headers, json={"full_name": "Versioned"})
+    r = client.get(url, headers=headers | {"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["full_name"] == "Versioned"
+    assert r.headers["etag"] != etag
+
+
+def test_update_user_deactivate_invalidates_cache(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    username = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=username, password=password)
+    user = users.create_user(session=db, user_create=user_in)
+    headers = user_authentication_headers(
+        client=client, email=username, password=password
+    )
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+
     r = client.patch(
         f"{settings.API_V1_STR}/users/{user.id}",
         headers=superuser_token_headers,
-        json=data,
+        json={"is_active": False},
     )
     assert r.status_code == 200
-    updated_user = r.json()
-    assert updated_user["full_name"] == "Updated_full_name"
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 400
+    assert r.json() == {"detail": "Inactive user"}
 
 
 def test_update_user_not_exists(
@@ -347,6 +560,17 @@ def test_update_user_not_exists(
     assert r.json()["detail"] == "The user with this id does not exist in the system"
 
 
+def test_update_user_me_email_null(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me",
+        headers=normal_user_token_headers,
+        json={"email": None},
+    )
+    assert r.status_code == 422
+
+
 def test_update_user_email_exists(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -370,21 +594,84 @@ def test_update_user_email_exists(
     assert r.json()["detail"] == "User with this email already exists"
 
 
-def test_delete_user_super_user(
+def test_update_user_email_null(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = users.create_user(session=db, user_create=user_in)
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"email": None, "full_name": "Renamed"},
+    )
+    assert r.status_code == 422
+    db.refresh(user)
+    assert user.email == user_in.email
+
+
+def test_delete_user_super_user(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    assert_max_queries: MaxQueries,
 ) -> None:
     username = random_email()
     password = random_lower_string()
     user_in = UserCreate(email=username, password=password)
     user = users.create_user(session=db, user_create=user_in)
     user_id = user.id
-    r = client.delete(
-        f"{settings.API_V1_STR}/users/{user_id}",
+    assert user_id is not None
+    # The budget must not grow with the number of owned items
+    items_in = [ItemCreate(title=random_lower_string()) for _ in range(10)]
+    users.create_items(session=db, items_in=items_in, owner_id=user_id)
+    with assert_max_queries(2):
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{user_id}",
+            headers=superuser_token_headers,
+        )
+    assert r.status_code == 202
+    deleted_user = r.json()
+    assert deleted_user["message"] == "User deletion started"
+
+    client.portal.call(user_purger.purge_pending)  # type: ignore[union-attr]
+    r = client.get(
+        f"{settings.API_V1_STR}/users/{user_id}/deletion",
         headers=superuser_token_headers,
     )
     assert r.status_code == 200
-    deleted_user = r.json()
-    assert deleted_user["message"] == "User deleted successfully"
+    deletion = r.json()
+    assert deletion["status"] == "completed"
+    assert deletion["items_total"] == 10
+    assert deletion["items_deleted"] == 10
+    assert db.exec(select(User).where(User.id == user_id)).first() is None
+
+
+def test_update_user_being_deleted(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = users.create_user(session=db, user_create=user_in)
+    assert user.id is not None
+    # A deletion the purge worker hasn't finished
+    user.is_active = False
+    db.add(user)
+    db.add(UserDeletion(user_id=user.id, status="running", items_total=10))
+    db.commit()
+    # Locked so the background purge worker skips it
+    locked = select(UserDeletion).where(UserDeletion.user_id == user.id)
+    db.exec(locked.with_for_update()).one()
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": True},
+    )
+    assert r.status_code == 409
+    assert r.json()["detail"] == "The user is being deleted"
+    db.refresh(user)
+    assert not user.is_active
+    db.commit()
 
 
 def test_delete_user_current_user(client: TestClient, db: Session) -> None:
@@ -407,9 +694,34 @@ def test_delete_user_current_user(client: TestClient, db: Session) -> None:
         f"{settings.API_V1_STR}/users/{user_id}",
         headers=headers,
     )
-    assert r.status_code == 200
+    assert r.status_code == 202
     deleted_user = r.json()
-    assert deleted_user["message"] == "User deleted successfully"
+    assert deleted_user["message"] == "User deletion started"
+
+    # Deactivated right away
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 400
+
+
+def test_read_user_deletion_not_found(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/99999999/deletion",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 404
+    assert r.json()["detail"] == "User deletion not found"
+
+
+def test_read_user_deletion_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/1/deletion",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 400
 
 
 def test_delete_user_not_found(
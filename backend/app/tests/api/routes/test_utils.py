@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.health import ReadinessCheck
+from app.core.mail import mail_dispatcher
+from app.tests.utils.smtp import DebuggingHandler
+
+
+def test_db_pool(client: TestClient, superuser_token_headers: dict[str, str]) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    result = r.json()
+    assert set(result["pools"]) == {"sync", "async"}
+    async_pool = result["pools"]["async"]
+    assert async_pool["size"] == settings.DB_POOL_SIZE
+    assert async_pool["checkouts"] >= 1
+
+
+def test_db_pool_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool", headers=normal_user_token_headers
+    )
+    assert r.status_code == 400
+
+
+def test_cache_stats(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    url = f"{settings.API_V1_STR}/items/"
+    client.get(url, headers=normal_user_token_headers)
+    client.get(url, headers=normal_user_token_headers)
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/cache", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    result = r.json()
+    assert result["backend"] == "memory"
+    assert (result["hits"], result["misses"]) == (1, 1)
+    assert result["hit_ratio"] == 0.5
+    assert result["memory_bytes"] > 0
+
+
+def test_cache_stats_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/cache", headers=normal_user_token_headers
+    )
+    assert r.status_code == 400
+
+
+def test_test_email(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    smtp_server: DebuggingHandler,
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/utils/test-email/",
+        headers=superuser_token_headers,
+        params={"email_to": "test-email@example.com"},
+    )
+    assert r.status_code == 201
+    client.portal.call(mail_dispatcher.join)  # type: ignore[union-attr]
+    assert [message["To"] for message in smtp_server.messages] == [
+        "test-email@example.com"
+    ]
+
+
+def test_health_live(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/utils/health/live")
+    assert r.status_code == 200
+
+
+def test_health_ready(client: TestClient) -> None:
+    with patch("app.api.routes.utils.readiness_check", ReadinessCheck()):
+        r = client.get(f"{settings.API_V1_STR}/utils/health/ready")
+        assert r.status_code == 200
+        assert r.json()["ready"]
+
+    with patch("app.api.routes.utils.readiness_check", ReadinessCheck()), patch(
+        "app.core.health.get_migration_head", return_value="newer"
+    ):
+        r = client.get(f"{settings.API_V1_STR}/utils/health/ready")
+        assert r.status_code == 503
+        assert r.json()["migration_head"] == "newer"
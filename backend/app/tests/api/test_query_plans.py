@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, text
+from sqlmodel import Session, col
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.purge import user_purger
+from app.core.security import get_password_hash
+from app.model.users import ItemCreate, User
+from app.repository import users
+from app.tests.utils.explain import assert_no_seq_scan, capture_statements
+from app.tests.utils.utils import random_email, random_lower_string
+
+SEED_OWNERS = 40
+SEED_ITEMS_PER_OWNER = 500
+
+
+@pytest.fixture(scope="module")
+def seeded_owner_ids(db: Session) -> list[int]:
+    # Enough rows for the planner to prefer an index over reading all of item
+    hashed_password = get_password_hash(random_lower_string())
+    result = db.scalars(
+        insert(User).returning(col(User.id)),
+        [
+            {
+                "email": random_email(),
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "is_superuser": False,
+            }
+            for _ in range(SEED_OWNERS)
+        ],
+    )
+    owner_ids = [owner_id for owner_id in result if owner_id is not None]
+    for owner_id in owner_ids:
+        items_in = [
+            ItemCreate(title=random_lower_string()) for _ in range(SEED_ITEMS_PER_OWNER)
+        ]
+        users.create_items(session=db, items_in=items_in, owner_id=owner_id)
+    db.execute(text("ANALYZE item"))
+    db.commit()
+    return owner_ids
+
+
+def test_read_items_normal_user_uses_index(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+    seeded_owner_ids: list[int],
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        json={"title": "Planned"},
+    )
+    item_id = r.json()["id"]
+    with capture_statements(async_engine.sync_engine) as statements:
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            params={"limit": 1},
+        )
+        assert r.status_code == 200
+        client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            params={"cursor": r.json()["next_cursor"] or "WzBd"},
+        )
+        client.get(
+            f"{settings.API_V1_STR}/items/{item_id}",
+            headers=normal_user_token_headers,
+        )
+    assert statements
+    assert_no_seq_scan(db, statements, {"item"})
+
+
+def test_delete_user_uses_index(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    seeded_owner_ids: list[int],
+) -> None:
+    with capture_statements(async_engine.sync_engine) as statements, patch(
+        "app.core.config.settings.USER_PURGE_CHUNK_SIZE", 100
+    ):
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{seeded_owner_ids[0]}",
+            headers=superuser_token_headers,
+        )
+        assert r.status_code == 202
+        client.portal.call(user_purger.purge_pending)  # type: ignore[union-attr]
+    assert any("DELETE FROM item" in statement for statement, _ in statements)
+    assert_no_seq_scan(db, statements, {"item"})
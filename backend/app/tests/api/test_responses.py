@@ -0,0 +1,22 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.api.responses import FastJSONResponse
+from app.core.config import settings
+from app.model.users import Item, ItemsOut
+
+
+def test_fast_json_response_renders_model() -> None:
+    item = Item(id=1, title="Foo", description=None, owner_id=2)
+    content = ItemsOut(data=[item], count=1)
+    response = FastJSONResponse(content)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == json.loads(content.model_dump_json())
+
+
+def test_fast_json_response_keeps_schema(client: TestClient) -> None:
+    openapi = client.get(f"{settings.API_V1_STR}/openapi.json").json()
+    get_items = openapi["paths"][f"{settings.API_V1_STR}/items/"]["get"]
+    schema = get_items["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema == {"$ref": "#/components/schemas/ItemsOut"}
@@ -1,13 +1,22 @@
-from collections.abc import Generator
+import socket
+from collections.abc import AsyncGenerator, Generator
+from unittest.mock import patch
 
 import pytest
+from aiosmtpd.controller import Controller
 from fastapi.testclient import TestClient
 from sqlmodel import Session, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.cache import MemoryCache
 from app.core.config import settings
-from app.core.db import engine, init_db
+from app.core.db import async_engine, engine, init_db
 from app.main import app
 from app.model.users import Item, User
+from app.tests.utils.queries import MaxQueries
+from app.tests.utils.queries import assert_max_queries as _assert_max_queries
+from app.tests.utils.redis import FakeRedisServer
+from app.tests.utils.smtp import DebuggingHandler
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -24,6 +33,28 @@ def db() -> Generator[Session, None, None]:
         session.commit()
 
 
+@pytest.fixture(autouse=True)
+def item_cache() -> Generator[MemoryCache, None, None]:
+    """
+    Start each test with an empty item cache, tests also write items directly.
+    """
+    cache = MemoryCache(maxsize=settings.CACHE_MAX_SIZE)
+    with patch("app.repository.item_cache.item_cache", cache):
+        yield cache
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+    await async_engine.dispose()
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
@@ -40,3 +71,44 @@ def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]
     return authentication_token_from_email(
         client=client, email=settings.EMAIL_TEST_USER, db=db
     )
+
+
+@pytest.fixture
+def assert_max_queries() -> MaxQueries:
+    return _assert_max_queries
+
+
+@pytest.fixture
+def smtp_server() -> Generator[DebuggingHandler, None, None]:
+    """
+    Point the app to a local SMTP server and return what it received.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = DebuggingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    with patch.multiple(
+        settings,
+        SMTP_HOST="127.0.0.1",
+        SMTP_PORT=port,
+        SMTP_TLS=False,
+        SMTP_SSL=False,
+        SMTP_USER=None,
+        SMTP_PASSWORD=None,
+        SMTP_RETRY_BACKOFF_SECONDS=0.01,
+    ):
+        yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def redis_server() -> Generator[FakeRedisServer, None, None]:
+    """
+    Start a local server speaking the Redis protocol.
+    """
+    server = FakeRedisServer()
+    server.start()
+    yield server
+    server.stop()
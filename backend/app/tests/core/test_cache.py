@@ -0,0 +1,125 @@
+import asyncio
+from collections.abc import AsyncIterator
+from unittest.mock import patch
+
+import pytest
+
+from app.core.cache import (
+    Cache,
+    MemoryCache,
+    NullCache,
+    RedisCache,
+    TTLCache,
+    create_cache,
+)
+from app.tests.utils.redis import FakeRedisServer
+
+
+def test_ttl_cache_hit_and_miss() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=10, ttl=5)
+    with patch("app.core.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.core.cache.time.monotonic", return_value=106.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_add_keeps_unexpired_value() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=10, ttl=60)
+    cache.add("a", 1)
+    cache.add("a", 2)
+    assert cache.get("a") == 1
+    cache.set("b", 1, ttl=-1)
+    cache.add("b", 2)
+    assert cache.get("b") == 2
+
+
+@pytest.fixture(params=["memory", "redis"])
+async def cache(
+    request: pytest.FixtureRequest, redis_server: FakeRedisServer
+) -> AsyncIterator[Cache]:
+    if request.param == "memory":
+        yield MemoryCache(maxsize=10)
+        return
+    redis_cache = RedisCache(redis_server.url)
+    yield redis_cache
+    await redis_cache.close()
+
+
+@pytest.mark.anyio
+async def test_cache_get_and_add(cache: Cache) -> None:
+    assert await cache.get("a") is None
+    await cache.add("a", b"1", 60)
+    await cache.add("a", b"2", 60)
+    assert await cache.get("a") == b"1"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_ratio == 0.5
+    assert await cache.memory_bytes() > 0
+
+
+@pytest.mark.anyio
+async def test_cache_entries_expire(cache: Cache) -> None:
+    await cache.add("a", b"1", 0.005)
+    await asyncio.sleep(0.02)
+    assert await cache.get("a") is None
+    await cache.add("a", b"2", 60)
+    assert await cache.get("a") == b"2"
+
+
+@pytest.mark.anyio
+async def test_cache_invalidation_holds_off_stale_adds(cache: Cache) -> None:
+    await cache.add("a", b"1", 60)
+    await cache.invalidate("a", "b")
+    assert await cache.get("a") is None
+    # E.g. a read that started before the write finishes after it
+    await cache.add("a", b"1", 60)
+    await cache.add("b", b"1", 60)
+    assert await cache.get("a") is None
+    assert await cache.get("b") is None
+
+    with patch("app.core.config.settings.CACHE_INVALIDATION_HOLD_SECONDS", 0.005):
+        await cache.invalidate("a")
+    await asyncio.sleep(0.02)
+    await cache.add("a", b"2", 60)
+    assert await cache.get("a") == b"2"
+
+
+@pytest.mark.anyio
+async def test_redis_cache_unreachable_server_is_skipped() -> None:
+    cache = RedisCache("redis://127.0.0.1:1/0")
+    await cache.add("a", b"1", 60)
+    await cache.invalidate("a")
+    assert await cache.get("a") is None
+    assert cache.misses == 1
+    assert await cache.memory_bytes() == 0
+    await cache.close()
+
+
+@pytest.mark.anyio
+async def test_cache_is_off_by_default() -> None:
+    cache = create_cache()
+    assert isinstance(cache, NullCache)
+    await cache.add("a", b"1", 60)
+    assert await cache.get("a") is None
+    assert cache.misses == 1
+    await cache.close()
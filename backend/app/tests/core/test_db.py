@@ -0,0 +1,47 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+from app.core.db import PoolStats, _instrumented_pool_class
+
+
+def _sample(name: str, pool: str) -> float:
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0.0
+
+
+def test_pool_stats_count_checkout_timeouts() -> None:
+    stats = PoolStats("test-timeouts")
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=_instrumented_pool_class(QueuePool, stats),
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    with engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+    engine.dispose()
+    assert stats.timeouts == 1
+    assert stats.wait_seconds_max >= 0.1
+    assert _sample("db_pool_checkout_timeouts_total", stats.name) == 1
+    assert _sample("db_pool_checkout_wait_seconds_count", stats.name) == 2
+
+
+def test_pool_stats_export_usage() -> None:
+    stats = PoolStats("test-usage")
+    engine = create_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        poolclass=_instrumented_pool_class(QueuePool, stats),
+        pool_size=1,
+        max_overflow=1,
+    )
+    with engine.connect(), engine.connect():
+        assert _sample("db_pool_checked_out", stats.name) == 2
+        assert _sample("db_pool_overflow", stats.name) == 1
+    assert _sample("db_pool_checked_out", stats.name) == 0
+    assert _sample("db_pool_overflow", stats.name) == 0
+    engine.dispose()
@@ -0,0 +1,80 @@
+from collections.abc import AsyncIterator
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.health import ReadinessCheck, get_migration_head
+
+
+@pytest.fixture
+async def unreachable_engine() -> AsyncIterator[AsyncEngine]:
+    url = settings.SQLALCHEMY_DATABASE_URI.unicode_string().replace(
+        f":{settings.POSTGRES_PORT}/", ":1/"
+    )
+    engine = create_async_engine(url, poolclass=NullPool)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_ready() -> None:
+    result = await ReadinessCheck().get()
+    assert result == {
+        "ready": True,
+        "database": True,
+        "migration": get_migration_head(),
+        "migration_head": get_migration_head(),
+    }
+
+
+@pytest.mark.anyio
+async def test_ready_result_is_cached() -> None:
+    check = ReadinessCheck()
+    statements: list[str] = []
+
+    def before_cursor_execute(
+        conn: object, cursor: object, statement: str, *args: object
+    ) -> None:
+        statements.append(statement)
+
+    event.listen(
+        async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+    try:
+        await check.get()
+        await check.get()
+        assert len(statements) == 1
+        with patch("app.core.config.settings.HEALTH_CHECK_CACHE_SECONDS", 0):
+            await check.get()
+        assert len(statements) == 2
+    finally:
+        event.remove(
+            async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+        )
+    await async_engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_not_ready_when_database_unreachable(
+    unreachable_engine: AsyncEngine,
+) -> None:
+    with patch("app.core.health.async_engine", unreachable_engine):
+        result = await ReadinessCheck().get()
+    assert not result["ready"]
+    assert not result["database"]
+    assert result["migration"] is None
+
+
+@pytest.mark.anyio
+async def test_not_ready_when_migration_is_behind() -> None:
+    with patch("app.core.health.get_migration_head", return_value="newer"):
+        result = await ReadinessCheck().get()
+    assert not result["ready"]
+    assert result["database"]
+    assert result["migration_head"] == "newer"
+    await async_engine.dispose()
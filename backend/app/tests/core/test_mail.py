@@ -0,0 +1,133 @@
+import smtplib
+from unittest.mock import patch
+
+import pytest
+
+from app.core.config import settings
+from app.core.mail import MailDispatcher, OutgoingEmail, _connect
+from app.tests.utils.smtp import DebuggingHandler
+
+
+def _email(i: int) -> OutgoingEmail:
+    return OutgoingEmail(
+        email_to=f"user{i}@example.com",
+        subject=f"Subject {i}",
+        html_content="<p>Hi</p>",
+    )
+
+
+@pytest.mark.anyio
+async def test_dispatcher_reuses_connection(smtp_server: DebuggingHandler) -> None:
+    dispatcher = MailDispatcher()
+    with patch("app.core.config.settings.SMTP_POOL_SIZE", 1):
+        for i in range(5):
+            await dispatcher.enqueue(_email(i))
+        await dispatcher.join()
+        await dispatcher.enqueue(_email(5))
+        await dispatcher.stop()
+
+    assert dispatcher.sent == 6
+    assert [m["To"] for m in smtp_server.messages] == [
+        f"user{i}@example.com" for i in range(6)
+    ]
+    assert smtp_server.messages[0]["Subject"] == "Subject 0"
+    assert settings.EMAILS_FROM_EMAIL in smtp_server.messages[0]["From"]
+    assert len(smtp_server.peers) == 1
+
+
+@pytest.mark.anyio
+async def test_dispatcher_retries_temporary_errors(
+    smtp_server: DebuggingHandler,
+) -> None:
+    smtp_server.replies = ["451 Try again later", "451 Try again later"]
+    dispatcher = MailDispatcher()
+    await dispatcher.enqueue(_email(0))
+    await dispatcher.stop()
+
+    assert dispatcher.sent == 1
+    assert dispatcher.failed == 0
+    assert len(smtp_server.messages) == 1
+
+
+@pytest.mark.anyio
+async def test_dispatcher_gives_up(smtp_server: DebuggingHandler) -> None:
+    smtp_server.replies = ["451 Try again later"] * 3
+    dispatcher = MailDispatcher()
+    with patch("app.core.config.settings.SMTP_MAX_RETRIES", 1):
+        await dispatcher.enqueue(_email(0))
+        await dispatcher.stop()
+
+    assert dispatcher.sent == 0
+    assert dispatcher.failed == 1
+    assert smtp_server.messages == []
+
+
+@pytest.mark.anyio
+async def test_dispatcher_drops_rejected_email(smtp_server: DebuggingHandler) -> None:
+    smtp_server.replies = ["550 No such user"]
+    dispatcher = MailDispatcher()
+    with patch("app.core.config.settings.SMTP_POOL_SIZE", 1):
+        await dispatcher.enqueue(_email(0))
+        await dispatcher.enqueue(_email(1))
+        await dispatcher.stop()
+
+    assert dispatcher.sent == 1
+    assert dispatcher.failed == 1
+    assert [m["To"] for m in smtp_server.messages] == ["user1@example.com"]
+
+
+@pytest.mark.anyio
+async def test_dispatcher_survives_unsendable_email(
+    smtp_server: DebuggingHandler,
+) -> None:
+    dispatcher = MailDispatcher()
+    with patch("app.core.config.settings.SMTP_POOL_SIZE", 1):
+        # smtplib can't encode a non-ASCII address without SMTPUTF8
+        await dispatcher.enqueue(
+            OutgoingEmail(email_to="jöhn@example.com", subject="", html_content="")
+        )
+        await dispatcher.enqueue(_email(1))
+        await dispatcher.join()
+        await dispatcher.enqueue(_email(2))
+        await dispatcher.stop()
+
+    assert dispatcher.sent == 2
+    assert dispatcher.failed == 1
+    assert [m["To"] for m in smtp_server.messages] == [
+        "user1@example.com",
+        "user2@example.com",
+    ]
+
+
+@pytest.mark.anyio
+async def test_dispatcher_retries_only_failing_email(
+    smtp_server: DebuggingHandler,
+) -> None:
+    smtp_server.deferred_recipients = {"user0@example.com"}
+    dispatcher = MailDispatcher()
+    with patch("app.core.config.settings.SMTP_POOL_SIZE", 1), patch(
+        "app.core.config.settings.SMTP_MAX_RETRIES", 1
+    ):
+        await dispatcher.enqueue(_email(0))
+        await dispatcher.enqueue(_email(1))
+        await dispatcher.stop()
+
+    assert dispatcher.sent == 1
+    assert dispatcher.failed == 1
+    assert [m["To"] for m in smtp_server.messages] == ["user1@example.com"]
+
+
+def test_connect_closes_socket_when_login_fails(
+    smtp_server: DebuggingHandler,
+) -> None:
+    # The test server doesn't support AUTH, like wrong credentials it fails
+    # after the socket is open
+    with (
+        patch("app.core.config.settings.SMTP_USER", "user"),
+        patch.object(
+            smtplib.SMTP, "close", autospec=True, side_effect=smtplib.SMTP.close
+        ) as close,
+        pytest.raises(smtplib.SMTPException),
+    ):
+        _connect()
+    close.assert_called_once()
@@ -0,0 +1,83 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import RepeatedQueryMiddleware
+
+
+def _sample(name: str, labels: dict[str, str]) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_metrics_by_route(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    labels = {"route": "users-read_user_me", "method": "GET"}
+    requests = _sample("http_requests_total", {**labels, "status": "200"})
+    observed = _sample("http_request_duration_seconds_count", labels)
+    queries = _sample("http_request_db_queries_sum", labels)
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers)
+    assert r.status_code == 200
+
+    assert _sample("http_requests_total", {**labels, "status": "200"}) == requests + 1
+    assert _sample("http_request_duration_seconds_count", labels) == observed + 1
+    assert _sample("http_request_db_queries_sum", labels) >= queries
+
+
+def test_metrics_unmatched_route(client: TestClient) -> None:
+    labels = {"route": "unmatched", "method": "GET", "status": "404"}
+    before = _sample("http_requests_total", labels)
+    r = client.get("/does-not-exist")
+    assert r.status_code == 404
+    assert _sample("http_requests_total", labels) == before + 1
+
+
+def test_metrics_counts_db_queries(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    labels = {"route": "users-read_users", "method": "GET"}
+    before = _sample("http_request_db_queries_sum", labels)
+    r = client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers)
+    assert r.status_code == 200
+    assert _sample("http_request_db_queries_sum", labels) >= before + 1
+
+
+def test_metrics_endpoint(client: TestClient) -> None:
+    client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "http_requests_total" in r.text
+    assert "password_hash_jobs_pending" in r.text
+    assert "http_requests_in_progress" in r.text
+
+
+def test_repeated_query_warning(caplog: pytest.LogCaptureFixture) -> None:
+    async def endpoint(request: Request) -> PlainTextResponse:
+        with engine.connect() as connection:
+            for _ in range(3):
+                connection.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    app.add_middleware(RepeatedQueryMiddleware, threshold=2)
+    with caplog.at_level(logging.WARNING, logger="app.core.metrics"):
+        TestClient(app).get("/")
+    assert "executed the same statement 3 times: SELECT 1" in caplog.text
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    app.add_middleware(RepeatedQueryMiddleware, threshold=3)
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger="app.core.metrics"):
+        TestClient(app).get("/")
+    assert "executed the same statement" not in caplog.text
@@ -0,0 +1,150 @@
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.replicas import LAST_WRITE_COOKIE, ReplicaRouter
+
+
+def _replica_engine(port: int = settings.POSTGRES_PORT) -> AsyncEngine:
+    # The primary stands in for a replica, it reports no replication lag
+    url = settings.SQLALCHEMY_DATABASE_URI.unicode_string().replace(
+        f":{settings.POSTGRES_PORT}/", f":{port}/"
+    )
+    return create_async_engine(url, poolclass=NullPool)
+
+
+@pytest.fixture
+async def replica() -> AsyncIterator[AsyncEngine]:
+    engine = _replica_engine()
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.anyio
+async def test_healthy_replica_serves_reads(replica: AsyncEngine) -> None:
+    router = ReplicaRouter([replica])
+    # Unchecked replicas get no reads
+    assert router.get_engine() is async_engine
+    await router.check()
+    assert router.replicas[0].lag == 0
+    assert router.get_engine() is replica
+
+
+@pytest.mark.anyio
+async def test_reads_are_balanced_over_replicas(replica: AsyncEngine) -> None:
+    other = _replica_engine()
+    router = ReplicaRouter([replica, other])
+    await router.check()
+    assert {router.get_engine(), router.get_engine()} == {replica, other}
+    await other.dispose()
+
+
+@pytest.mark.anyio
+async def test_unreachable_replica_falls_back_to_primary(
+    replica: AsyncEngine,
+) -> None:
+    unreachable = _replica_engine(port=1)
+    router = ReplicaRouter([unreachable, replica])
+    await router.check()
+    assert not router.replicas[0].healthy
+    assert all(router.get_engine() is replica for _ in range(3))
+
+    router = ReplicaRouter([unreachable])
+    await router.check()
+    assert router.get_engine() is async_engine
+
+
+@pytest.mark.anyio
+async def test_lagging_replica_falls_back_to_primary(replica: AsyncEngine) -> None:
+    router = ReplicaRouter([replica])
+    await router.check()
+    with patch("app.core.config.settings.REPLICA_MAX_LAG_SECONDS", -1):
+        assert router.get_engine() is async_engine
+
+
+@pytest.mark.anyio
+async def test_client_reads_own_writes_from_primary(replica: AsyncEngine) -> None:
+    router = ReplicaRouter([replica])
+    await router.check()
+    router.record_write("Bearer writer")
+    assert router.get_engine("Bearer writer") is async_engine
+    assert router.get_engine("Bearer reader") is replica
+    assert router.get_engine() is replica
+    # The time of the write sent back by the client, to any worker
+    assert router.get_engine(last_write=time.time() - 1) is async_engine
+    stale = time.time() - settings.READ_YOUR_WRITES_SECONDS
+    assert router.get_engine(last_write=stale) is replica
+    assert router.get_engine(last_write=time.time() + 3600) is replica
+
+
+def test_read_routes_use_replica(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    replica = _replica_engine()
+    router = ReplicaRouter([replica])
+    client.portal.call(router.check)  # type: ignore[union-attr]
+    statements: list[str] = []
+
+    @event.listens_for(replica.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        statements.append(statement)
+
+    url = f"{settings.API_V1_STR}/items/"
+    with patch("app.api.deps.replica_router", router):
+        r = client.get(url, headers=normal_user_token_headers)
+        assert r.status_code == 200
+        assert statements
+
+        statements.clear()
+        r = client.post(url, headers=normal_user_token_headers, json={"title": "New"})
+        assert r.status_code == 200
+        r = client.get(url, headers=normal_user_token_headers)
+        assert r.status_code == 200
+        assert not statements
+    client.portal.call(replica.dispose)  # type: ignore[union-attr]
+
+
+def test_reads_after_write_through_another_worker_use_primary(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    replica = _replica_engine()
+    writer_router = ReplicaRouter([replica])
+    reader_router = ReplicaRouter([replica])
+    for router in (writer_router, reader_router):
+        client.portal.call(router.check)  # type: ignore[union-attr]
+    statements: list[str] = []
+
+    @event.listens_for(replica.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        statements.append(statement)
+
+    url = f"{settings.API_V1_STR}/items/"
+    client.cookies.clear()
+    with patch("app.api.deps.replica_router", writer_router):
+        r = client.post(url, headers=normal_user_token_headers, json={"title": "New"})
+        assert r.status_code == 200
+    assert LAST_WRITE_COOKIE in r.cookies
+    # The worker serving the read never saw the write
+    with patch("app.api.deps.replica_router", reader_router):
+        r = client.get(url, headers=normal_user_token_headers)
+        assert r.status_code == 200
+        assert not statements
+
+        client.cookies.clear()
+        r = client.get(url, headers=normal_user_token_headers)
+        assert r.status_code == 200
+        assert statements
+    client.portal.call(replica.dispose)  # type: ignore[union-attr]
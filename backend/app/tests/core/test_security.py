@@ -0,0 +1,28 @@
+from unittest.mock import patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core import security
+from app.core.config import settings
+
+
+@pytest.mark.anyio
+async def test_password_hash_async_in_process_pool() -> None:
+    hashed_password = await security.get_password_hash_async("secret")
+    assert security.get_password_executor() is not None
+    assert security.verify_password("secret", hashed_password)
+    assert await security.verify_password_async("secret", hashed_password)
+    assert not await security.verify_password_async("wrong", hashed_password)
+    assert security.password_executor_stats()["pending"] == 0
+    assert REGISTRY.get_sample_value("password_hash_jobs_pending") == 0
+    workers = REGISTRY.get_sample_value("password_hash_workers")
+    assert workers == settings.PASSWORD_HASH_WORKERS
+
+
+@pytest.mark.anyio
+async def test_password_hash_async_without_process_pool() -> None:
+    with patch("app.core.config.settings.PASSWORD_HASH_WORKERS", 0):
+        assert security.get_password_executor() is None
+        hashed_password = await security.get_password_hash_async("secret")
+        assert await security.verify_password_async("secret", hashed_password)
@@ -0,0 +1,77 @@
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.model.users import Item, ItemCreate, User, UserCreate
+from app.repository import deletions, item_cache, users
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+@pytest.mark.anyio
+async def test_purge_user_in_chunks(async_db: AsyncSession) -> None:
+    # Finish deletions left over by other tests first
+    while await deletions.purge_next_chunk_async(session=async_db, chunk_size=1000):
+        pass
+
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = await users.create_user_async(session=async_db, user_create=user_in)
+    assert user and user.id is not None
+    user_id = user.id
+    items_in = [ItemCreate(title=random_lower_string()) for _ in range(10)]
+    db_items = await users.create_items_async(
+        session=async_db, items_in=items_in, owner_id=user_id
+    )
+    item_ids = [db_item.id for db_item in db_items if db_item.id is not None]
+    for item_id in item_ids:
+        await item_cache.cache_item(item_id, item={}, etag="cached")
+
+    scheduled = await deletions.schedule_user_deletion_async(
+        session=async_db, user_id=user_id
+    )
+    assert scheduled and scheduled.status == "pending"
+    db_user = await async_db.get(User, user_id, populate_existing=True)
+    assert db_user and not db_user.is_active
+
+    progress = []
+    while deletion := await deletions.purge_next_chunk_async(
+        session=async_db, chunk_size=4
+    ):
+        assert deletion.user_id == user_id
+        progress.append((deletion.status, deletion.items_deleted))
+    assert progress == [("running", 4), ("running", 8), ("completed", 10)]
+
+    finished = await deletions.get_user_deletion_async(
+        session=async_db, user_id=user_id
+    )
+    assert finished and finished.items_total == 10 and finished.finished_at
+    items = await async_db.exec(select(Item).where(Item.owner_id == user_id))
+    assert items.first() is None
+    db_users = await async_db.exec(select(User).where(User.id == user_id))
+    assert db_users.first() is None
+    for item_id in item_ids:
+        assert await item_cache.get_cached_item(item_id) is None
+
+
+@pytest.mark.anyio
+async def test_schedule_user_deletion_twice(async_db: AsyncSession) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = await users.create_user_async(session=async_db, user_create=user_in)
+    assert user and user.id is not None
+    first = await deletions.schedule_user_deletion_async(
+        session=async_db, user_id=user.id
+    )
+    second = await deletions.schedule_user_deletion_async(
+        session=async_db, user_id=user.id
+    )
+    assert first and second
+    assert second.created_at == first.created_at
+    db_user = await async_db.get(User, user.id, populate_existing=True)
+    assert db_user and db_user.version == 3
+
+
+@pytest.mark.anyio
+async def test_schedule_user_deletion_not_found(async_db: AsyncSession) -> None:
+    deletion = await deletions.schedule_user_deletion_async(
+        session=async_db, user_id=-1
+    )
+    assert deletion is None
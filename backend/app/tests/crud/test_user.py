@@ -1,8 +1,10 @@
+import pytest
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.security import verify_password
-from app.model.users import User, UserCreate, UserUpdate
+from app.model.users import ItemCreate, User, UserCreate, UserUpdate
 from app.repository import users
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -84,8 +86,72 @@ def test_update_user(db: Session) -> None:
     new_password = random_lower_string()
     user_in_update = UserUpdate(password=new_password, is_superuser=True)
     if user.id is not None:
-        users.update_user(session=db, db_user=user, user_in=user_in_update)
+        users.update_user(session=db, user_id=user.id, user_in=user_in_update)
     user_2 = db.get(User, user.id)
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+    assert user_2.version == 2
+
+
+@pytest.mark.anyio
+async def test_create_user_async(async_db: AsyncSession) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = await users.create_user_async(session=async_db, user_create=user_in)
+    assert user
+    assert user.email == email
+    assert verify_password(password, user.hashed_password)
+    duplicate = await users.create_user_async(session=async_db, user_create=user_in)
+    assert duplicate is None
+
+
+@pytest.mark.anyio
+async def test_authenticate_user_async(async_db: AsyncSession) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = await users.create_user_async(session=async_db, user_create=user_in)
+    assert user
+    authenticated_user = await users.authenticate_async(
+        session=async_db, email=email, password=password
+    )
+    assert authenticated_user
+    assert user.email == authenticated_user.email
+    wrong_user = await users.authenticate_async(
+        session=async_db, email=email, password=random_lower_string()
+    )
+    assert wrong_user is None
+
+
+@pytest.mark.anyio
+async def test_update_user_async(async_db: AsyncSession) -> None:
+    email = random_email()
+    user_in = UserCreate(email=email, password=random_lower_string())
+    user = await users.create_user_async(session=async_db, user_create=user_in)
+    assert user
+    new_password = random_lower_string()
+    user_in_update = UserUpdate(password=new_password, full_name="Async")
+    assert user.id is not None
+    await users.update_user_async(
+        session=async_db, user_id=user.id, user_in=user_in_update
+    )
+    user_2 = await async_db.get(User, user.id)
+    assert user_2
+    assert user_2.full_name == "Async"
+    assert verify_password(new_password, user_2.hashed_password)
+    assert user_2.version == 2
+
+
+def test_create_items(db: Session) -> None:
+    user = users.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    assert user.id is not None
+    items_in = [ItemCreate(title=random_lower_string()) for _ in range(3)]
+    items = users.create_items(session=db, items_in=items_in, owner_id=user.id)
+    assert [item.title for item in items] == [item.title for item in items_in]
+    assert all(item.id is not None and item.owner_id == user.id for item in items)
+    assert users.create_items(session=db, items_in=[], owner_id=user.id) == []
@@ -2,7 +2,7 @@ from unittest.mock import MagicMock, patch
 
 from sqlmodel import select
 
-from app.backend_pre_start import init, logger
+from app.backend_pre_start import deadline_seconds, init, logger, max_wait_seconds
 
 
 def test_init_successful_connection() -> None:
@@ -28,3 +28,29 @@ def test_init_successful_connection() -> None:
         assert session_mock.exec.called_once_with(
             select(1)
         ), "The session should execute a select statement once."
+
+
+def test_init_backs_off_until_deadline() -> None:
+    clock = [0.0]
+    waits: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        waits.append(seconds)
+        clock[0] += seconds
+
+    with patch("app.backend_pre_start.Session", side_effect=OSError("down")), patch(
+        "tenacity.time.monotonic", lambda: clock[0]
+    ), patch.object(init.retry, "sleep", sleep), patch.object(  # type: ignore[attr-defined]
+        logger, "error"
+    ), patch.object(logger, "info"):
+        try:
+            init(MagicMock())
+            gave_up = False
+        except Exception:
+            gave_up = True
+
+    assert gave_up
+    assert deadline_seconds <= sum(waits) < deadline_seconds + max_wait_seconds
+    assert all(0 <= wait <= max_wait_seconds for wait in waits)
+    # Randomized, rather than the same sequence in every container
+    assert len(set(waits)) > 1
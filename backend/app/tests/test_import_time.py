@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.importtime import measure, profile_import
+
+# Only needed to send emails, handle tokens and passwords, or by other tools
+LAZY_PACKAGES = {"alembic", "emails", "jinja2", "jose", "passlib", "redis", "requests"}
+# What importing app.main can't avoid, the app's own modules may add at most
+# IMPORT_TIME_BUDGET_RATIO - 1 of its import time on top. Relative to the
+# same machine so the budget holds on slow CI runners
+FRAMEWORK_MODULES = (
+    "fastapi, sqlmodel, sqlalchemy.ext.asyncio, psycopg, prometheus_client, "
+    "pydantic_settings, orjson, multipart, email_validator"
+)
+IMPORT_TIME_BUDGET_RATIO = 1.4
+
+
+@pytest.mark.parametrize("module", ["app.main", "app.initial_data"])
+def test_heavy_dependencies_are_imported_lazily(module: str) -> None:
+    imported = {name.split(".")[0] for name in profile_import(module).imported()}
+    assert not imported & LAZY_PACKAGES
+
+
+def test_import_time_budget() -> None:
+    framework_seconds, _ = measure(FRAMEWORK_MODULES, runs=3)
+    app_seconds, profile = measure("app.main", runs=3)
+    slowest = sorted(profile.packages().items(), key=lambda item: -item[1])[:10]
+    assert app_seconds < framework_seconds * IMPORT_TIME_BUDGET_RATIO, (
+        f"Importing app.main took {app_seconds:.3f}s, the framework alone "
+        f"{framework_seconds:.3f}s. Slowest packages (us): {slowest}"
+    )
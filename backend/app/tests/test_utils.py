@@ -0,0 +1,22 @@
+from app.utils import (
+    generate_new_account_email,
+    get_email_templates,
+    load_email_templates,
+)
+
+
+def test_load_email_templates() -> None:
+    email_templates = get_email_templates()
+    email_templates.cache.clear()  # type: ignore[union-attr]
+    load_email_templates()
+    assert len(email_templates.cache) == len(email_templates.list_templates())  # type: ignore[arg-type]
+    template = email_templates.get_template("new_account.html")
+    assert email_templates.get_template("new_account.html") is template
+
+
+def test_render_email_template() -> None:
+    email_data = generate_new_account_email(
+        email_to="new@example.com", username="new@example.com", password="secret"
+    )
+    assert "new@example.com" in email_data.html_content
+    assert "{{" not in email_data.html_content
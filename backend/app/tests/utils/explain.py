@@ -0,0 +1,60 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlmodel import Session
+
+
+@contextmanager
+def capture_statements(*engines: Engine) -> Iterator[list[tuple[str, Any]]]:
+    """
+    Collect the SQL statements and parameters sent through the engines.
+    """
+    statements: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        statements.append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seq_scanned_tables(plan: dict[str, Any]) -> set[str]:
+    tables = set()
+    if plan["Node Type"] == "Seq Scan":
+        tables.add(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        tables |= seq_scanned_tables(subplan)
+    return tables
+
+
+def assert_no_seq_scan(
+    db: Session, statements: list[tuple[str, Any]], tables: set[str]
+) -> None:
+    """
+    EXPLAIN each captured statement and fail if it scans one of the tables
+    sequentially.
+    """
+    connection = db.connection()
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            continue
+        result = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        )
+        plan = result.scalar_one()[0]["Plan"]
+        scanned = seq_scanned_tables(plan) & tables
+        assert not scanned, f"Sequential scan on {scanned} for: {statement}"
@@ -0,0 +1,46 @@
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from typing import Any
+
+from sqlalchemy import event
+
+from app.core.db import async_engine, engine, replica_engines
+from app.core.metrics import request_query_stats
+
+Statements = list[tuple[str, Any]]
+MaxQueries = Callable[[int], AbstractContextManager[Statements]]
+
+
+@contextmanager
+def assert_max_queries(n: int) -> Iterator[Statements]:
+    """
+    Fail if the requests served inside the block run more than `n` statements.
+    Statements of background tasks, like the user purge, are not counted.
+    """
+    statements: Statements = []
+
+    def before_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        # Only set while MetricsMiddleware serves a request
+        if request_query_stats.get() is not None:
+            statements.append((statement, parameters))
+
+    engines = [engine, async_engine.sync_engine]
+    engines += [replica_engine.sync_engine for replica_engine in replica_engines]
+    for db_engine in engines:
+        event.listen(db_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for db_engine in engines:
+            event.remove(db_engine, "before_cursor_execute", before_cursor_execute)
+    executed = "\n".join(statement for statement, _ in statements)
+    assert (
+        len(statements) <= n
+    ), f"Expected at most {n} queries, got {len(statements)}:\n{executed}"
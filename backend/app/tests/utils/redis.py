@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class FakeRedisServer:
+    """
+    Minimal server speaking the Redis protocol, for the commands of the
+    cache: GET, SET with PX and NX, DEL and INFO. Other commands are answered
+    with OK. Runs its own event loop in a thread, like aiosmtpd's Controller.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 0
+    commands: list[list[bytes]] = field(default_factory=list)
+    _data: dict[bytes, tuple[float | None, bytes]] = field(default_factory=dict)
+
+    def start(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def serve() -> None:
+            self._server = await asyncio.start_server(
+                self._handle, self.host, self.port
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(serve(), self._loop)
+        started.wait(5)
+
+    def stop(self) -> None:
+        async def close() -> None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while command := await self._read_command(reader):
+                self.commands.append(command)
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[bytes]:
+        line = await reader.readline()
+        if not line:
+            return []
+        assert line.startswith(b"*")
+        command = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            command.append((await reader.readexactly(length + 2))[:-2])
+        return command
+
+    def _execute(self, command: list[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name == b"GET":
+            value = self._get(args[0])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            if b"NX" in options and self._get(key) is not None:
+                return b"$-1\r\n"
+            expires = None
+            if b"PX" in options:
+                expires = time.monotonic() + int(args[options.index(b"PX") + 3]) / 1000
+            self._data[key] = (expires, value)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            deleted = sum(self._data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % deleted
+        if name == b"INFO":
+            used_memory = sum(
+                len(key) + len(value) for key, (_, value) in self._data.items()
+            )
+            info = b"# Memory\r\nused_memory:%d\r\n" % used_memory
+            return b"$%d\r\n%s\r\n" % (len(info), info)
+        return b"+OK\r\n"
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        return value
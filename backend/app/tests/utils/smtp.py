@@ -0,0 +1,44 @@
+from dataclasses import dataclass, field
+from email import message_from_bytes
+from email.message import Message
+from typing import Any
+
+from aiosmtpd.smtp import SMTP, Envelope, Session
+
+
+@dataclass
+class DebuggingHandler:
+    """
+    aiosmtpd handler keeping the received emails in memory. Answers `replies`
+    in turn to the next DATA commands, e.g. "451 Try again later", and
+    `deferred_recipients` always with a temporary error.
+    """
+
+    messages: list[Message] = field(default_factory=list)
+    peers: set[Any] = field(default_factory=set)
+    replies: list[str] = field(default_factory=list)
+    deferred_recipients: set[str] = field(default_factory=set)
+
+    async def handle_RCPT(
+        self,
+        server: SMTP,
+        session: Session,
+        envelope: Envelope,
+        address: str,
+        rcpt_options: list[str],
+    ) -> str:
+        if address in self.deferred_recipients:
+            return "451 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(
+        self, server: SMTP, session: Session, envelope: Envelope
+    ) -> str:
+        if self.replies:
+            return self.replies.pop(0)
+        assert isinstance(envelope.content, bytes)
+        self.messages.append(message_from_bytes(envelope.content))
+        # One peer address per connection
+        self.peers.add(session.peer)
+        return "250 Message accepted for delivery"
@@ -1,14 +1,33 @@
-import logging
+import base64
+import hashlib
+import json
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cache
 from pathlib import Path
-from typing import Any
-
-import emails  # type: ignore
-from jinja2 import Template
-from jose import JWTError, jwt
+from typing import TYPE_CHECKING, Any
 
 from app.core.config import settings
+from app.core.mail import OutgoingEmail, mail_dispatcher
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+
+@cache
+def get_email_templates() -> "Environment":
+    """
+    Templates are compiled once per process and the bytecode is shared on
+    disk between processes, local mode also picks up edited templates.
+    Jinja is only imported when the first email is rendered.
+    """
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+    return Environment(
+        loader=FileSystemLoader(Path(__file__).parent / "email-templates" / "build"),
+        bytecode_cache=FileSystemBytecodeCache(),
+        auto_reload=settings.ENVIRONMENT == "local",
+    )
 
 
 @dataclass
@@ -17,37 +36,28 @@ class EmailData:
     subject: str
 
 
+def load_email_templates() -> None:
+    email_templates = get_email_templates()
+    for template_name in email_templates.list_templates():
+        email_templates.get_template(template_name)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    html_content = get_email_templates().get_template(template_name).render(context)
     return html_content
 
 
-def send_email(
+async def send_email(
     *,
     email_to: str,
     subject: str = "",
     html_content: str = "",
 ) -> None:
     assert settings.emails_enabled, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+    # Delivered in the background by the mail dispatcher
+    await mail_dispatcher.enqueue(
+        OutgoingEmail(email_to=email_to, subject=subject, html_content=html_content)
     )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
-    logging.info(f"send email result: {response}")
 
 
 def generate_test_email(email_to: str) -> EmailData:
@@ -96,6 +106,8 @@ def generate_new_account_email(
 
 
 def generate_password_reset_token(email: str) -> str:
+    from jose import jwt
+
     delta = timedelta(hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS)
     now = datetime.utcnow()
     expires = now + delta
@@ -109,8 +121,45 @@ def generate_password_reset_token(email: str) -> str:
 
 
 def verify_password_reset_token(token: str) -> str | None:
+    from jose import JWTError, jwt
+
     try:
         decoded_token = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         return str(decoded_token["sub"])
     except JWTError:
         return None
+
+
+def encode_cursor(values: list[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not values:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def make_etag(values: list[Any]) -> str:
+    """
+    Strong ETag of a representation identified by `values`, e.g. row ids and
+    versions.
+    """
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return f'"{hashlib.blake2b(raw, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
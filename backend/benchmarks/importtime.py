@@ -0,0 +1,115 @@
+"""
+Import time benchmark of the app's entry points, from `python -X importtime`.
+
+Each module is imported in fresh interpreters, the median of the runs is
+reported together with the packages that take the longest to import:
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime app.initial_data --runs 10 --top 30
+
+app/tests/test_import_time.py fails when the startup import cost regresses.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parents[1]
+
+
+@dataclass
+class ImportProfile:
+    # Cumulative microseconds per imported module, in import order
+    modules: dict[str, int]
+
+    @property
+    def total_us(self) -> int:
+        # Top-level imports are the ones -X importtime doesn't indent
+        return sum(
+            cumulative
+            for name, cumulative in self.modules.items()
+            if not name.startswith(" ")
+        )
+
+    def packages(self) -> dict[str, int]:
+        """
+        Cumulative microseconds per top-level package, of its most expensive
+        import. Includes what the package imports in turn.
+        """
+        packages: dict[str, int] = {}
+        for name, cumulative in self.modules.items():
+            package = name.strip().split(".")[0]
+            packages[package] = max(packages.get(package, 0), cumulative)
+        return packages
+
+    def imported(self) -> set[str]:
+        return {name.strip() for name in self.modules}
+
+
+def profile_import(module: str) -> ImportProfile:
+    """
+    Import `module` in a fresh interpreter.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # Keeps the indentation, which encodes the nesting
+        modules[name.rstrip()[1:]] = int(cumulative)
+    return ImportProfile(modules)
+
+
+def measure(module: str, *, runs: int) -> tuple[float, ImportProfile]:
+    """
+    Median import time of `module` in seconds, over `runs` fresh interpreters
+    after a warm-up run, and the profile of the median run.
+    """
+    profile_import(module)
+    profiles = sorted(
+        (profile_import(module) for _ in range(runs)),
+        key=lambda profile: profile.total_us,
+    )
+    median = profiles[len(profiles) // 2]
+    return median.total_us / 1_000_000, median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time of app modules")
+    parser.add_argument("modules", nargs="*", default=["app.main"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    report = {}
+    for module in args.modules:
+        seconds, profile = measure(module, runs=args.runs)
+        packages = sorted(profile.packages().items(), key=lambda item: -item[1])
+        report[module] = {
+            "seconds": round(seconds, 4),
+            "packages_ms": {
+                package: round(cumulative / 1000, 1)
+                for package, cumulative in packages[: args.top]
+            },
+        }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    print(
+        f"Median of {args.runs} runs: "
+        + ", ".join(f"{module} {report[module]['seconds']}s" for module in report),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
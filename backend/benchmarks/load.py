@@ -0,0 +1,335 @@
+"""
+Load benchmark of the main API endpoints.
+
+Seeds users and items in the configured database, then drives the app either
+in-process through httpx's ASGITransport or over HTTP against a local uvicorn,
+and reports latency percentiles and throughput per endpoint as JSON. Run it
+against a disposable database, the seeded rows are kept for the next run.
+
+    python -m benchmarks.load --output results.json
+    python -m benchmarks.load --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+from sqlmodel import Session, func, select
+
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.main import app
+from app.model.users import Item, ItemCreate, UserCreate
+from app.repository import users
+
+BENCH_PASSWORD = "benchmark-password"
+API = settings.API_V1_STR
+
+
+@dataclass
+class Dataset:
+    token: str
+    item_ids: list[int]
+
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def bench_email(index: int) -> str:
+    return f"bench-{index}@example.com"
+
+
+def seed(*, n_users: int, items_per_user: int) -> list[int]:
+    """
+    Create the benchmark users and top up their items, reusing what a previous
+    run left behind. Returns the owner id of each user.
+    """
+    owner_ids = []
+    with Session(engine) as session:
+        for index in range(n_users):
+            email = bench_email(index)
+            user = users.get_user_by_email(session=session, email=email)
+            if not user:
+                user_in = UserCreate(email=email, password=BENCH_PASSWORD)
+                user = users.create_user(session=session, user_create=user_in)
+            assert user.id is not None
+            statement = select(func.count()).where(Item.owner_id == user.id)
+            missing = items_per_user - session.exec(statement).one()
+            items_in = [
+                ItemCreate(title=f"bench item {i}", description="benchmark")
+                for i in range(missing)
+            ]
+            users.create_items(session=session, items_in=items_in, owner_id=user.id)
+            owner_ids.append(user.id)
+    return owner_ids
+
+
+async def login(client: httpx.AsyncClient, email: str) -> str:
+    r = await client.post(
+        f"{API}/login/access-token",
+        data={"username": email, "password": BENCH_PASSWORD},
+    )
+    r.raise_for_status()
+    return str(r.json()["access_token"])
+
+
+async def load_dataset(client: httpx.AsyncClient) -> Dataset:
+    token = await login(client, bench_email(0))
+    r = await client.get(
+        f"{API}/items/",
+        params={"limit": 100, "count": "none"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    r.raise_for_status()
+    return Dataset(token=token, item_ids=[item["id"] for item in r.json()["data"]])
+
+
+def scenarios(dataset: Dataset) -> dict[str, Request]:
+    headers = {"Authorization": f"Bearer {dataset.token}"}
+    item_ids = dataset.item_ids
+
+    def access_token(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.post(
+            f"{API}/login/access-token",
+            data={"username": bench_email(0), "password": BENCH_PASSWORD},
+        )
+
+    def read_items(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.get(f"{API}/items/", headers=headers)
+
+    def read_items_1000(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.get(f"{API}/items/", headers=headers, params={"limit": 1000})
+
+    def read_item(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        item_id = item_ids[i % len(item_ids)]
+        return client.get(f"{API}/items/{item_id}", headers=headers)
+
+    def create_item(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        data = {"title": f"bench created {i}", "description": "benchmark"}
+        return client.post(f"{API}/items/", headers=headers, json=data)
+
+    def read_user_me(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+        return client.get(f"{API}/users/me", headers=headers)
+
+    return {
+        "login-access_token": access_token,
+        "items-read_items": read_items,
+        "items-read_items-1000": read_items_1000,
+        "items-read_item": read_item,
+        "items-create_item": create_item,
+        "users-read_user_me": read_user_me,
+    }
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict[str, float]:
+    if len(latencies) < 2:
+        # quantiles() needs two samples, a single one is every percentile
+        quantiles = latencies * 99
+    else:
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    request: Request,
+    *,
+    n_requests: int,
+    concurrency: int,
+    warmup: int,
+) -> dict[str, float]:
+    for i in range(warmup):
+        (await request(client, i)).raise_for_status()
+
+    latencies: list[float] = []
+    counter = iter(range(n_requests))
+
+    async def worker() -> None:
+        for i in counter:
+            start = time.perf_counter()
+            response = await request(client, i)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def run(args: argparse.Namespace, base_url: str | None) -> dict[str, Any]:
+    if base_url is None:
+        transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    else:
+        client = httpx.AsyncClient(base_url=base_url)
+
+    results = {}
+    async with client:
+        dataset = await load_dataset(client)
+        for name, request in scenarios(dataset).items():
+            if args.only and name not in args.only:
+                continue
+            # Password hashing dominates login, so it gets fewer requests
+            n_requests = (
+                args.login_requests if name.startswith("login") else args.requests
+            )
+            results[name] = await run_scenario(
+                client,
+                request,
+                n_requests=n_requests,
+                concurrency=args.concurrency,
+                warmup=args.warmup,
+            )
+            print(f"{name:24} {json.dumps(results[name])}", file=sys.stderr)
+    if base_url is None:
+        await async_engine.dispose()
+    return results
+
+
+def start_uvicorn(port: int, workers: int) -> subprocess.Popen[bytes]:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ | {"PYTHONPATH": str(Path.cwd())},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(f"http://127.0.0.1:{port}{API}/utils/health/live")
+            if response.status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    """
+    Print the change of each scenario against the baseline and return the
+    ones whose throughput dropped or p95 grew by more than `threshold`.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        rps_change = result["rps"] / baseline[name]["rps"] - 1
+        p95_change = result["p95_ms"] / baseline[name]["p95_ms"] - 1
+        print(
+            f"{name:24} rps {rps_change:+.1%}  p95 {p95_change:+.1%}", file=sys.stderr
+        )
+        if rps_change < -threshold or p95_change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load benchmark of the API")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--items-per-user", type=int, default=1000)
+    parser.add_argument("--requests", type=positive_int, default=1000)
+    parser.add_argument("--login-requests", type=positive_int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument(
+        "--uvicorn",
+        action="store_true",
+        help="benchmark a local uvicorn over HTTP instead of the in-process app",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail when rps drops or p95 grows by more than this fraction",
+    )
+    args = parser.parse_args()
+
+    seed(n_users=args.users, items_per_user=args.items_per_user)
+
+    process = None
+    base_url = None
+    if args.uvicorn:
+        process = start_uvicorn(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        results = asyncio.run(run(args, base_url))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "target": "uvicorn" if args.uvicorn else "asgi",
+        "python": platform.python_version(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in {"output", "baseline", "threshold"}
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["target"] != report["target"]:
+            print(
+                f"Baseline was measured against {baseline['target']}", file=sys.stderr
+            )
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            sys.exit(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
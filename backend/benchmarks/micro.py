@@ -0,0 +1,163 @@
+"""
+Micro-benchmarks of the helpers that run on every request, using
+pytest-benchmark. Save a baseline, then fail later runs that are more than
+10% slower than it:
+
+    pytest benchmarks/micro.py --benchmark-save=baseline
+    pytest benchmarks/micro.py --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+
+import asyncio
+from collections.abc import Iterator
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from jinja2 import Template
+from jose import jwt
+from pytest_benchmark.fixture import BenchmarkFixture  # type: ignore[import-untyped]
+
+from app.api.responses import FastJSONResponse
+from app.core import security
+from app.core.config import settings
+from app.main import app
+from app.model.users import Item, ItemsOut, TokenPayload
+from app.utils import get_email_templates, render_email_template
+
+PASSWORD = "benchmark-password"
+
+
+@pytest.fixture(scope="module")
+def token() -> str:
+    return security.create_access_token(1, timedelta(minutes=5))
+
+
+@pytest.fixture(scope="module")
+def items() -> list[Item]:
+    return [
+        Item(id=i, title=f"Item {i}", description="Description " * 5, owner_id=1)
+        for i in range(100)
+    ]
+
+
+def test_create_access_token(benchmark: BenchmarkFixture) -> None:
+    benchmark(security.create_access_token, 1, timedelta(minutes=5))
+
+
+def test_decode_access_token(benchmark: BenchmarkFixture, token: str) -> None:
+    payload = benchmark(
+        jwt.decode, token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+    )
+    assert payload["sub"] == "1"
+
+
+def test_verify_password(benchmark: BenchmarkFixture) -> None:
+    hashed_password = security.get_password_hash(PASSWORD)
+    # bcrypt is deliberately slow, a few rounds are enough
+    assert benchmark.pedantic(
+        security.verify_password, args=(PASSWORD, hashed_password), rounds=5
+    )
+
+
+def test_token_payload_validation(benchmark: BenchmarkFixture) -> None:
+    payload: dict[str, Any] = {"sub": "1", "exp": 1700000000}
+    assert benchmark(TokenPayload.model_validate, payload).sub == 1
+
+
+def test_item_model_validate(benchmark: BenchmarkFixture) -> None:
+    data = {"id": 1, "title": "Item", "description": "Description", "owner_id": 1}
+    assert benchmark(Item.model_validate, data).id == 1
+
+
+def test_items_out_serialization(
+    benchmark: BenchmarkFixture, items: list[Item]
+) -> None:
+    def serialize() -> str:
+        return ItemsOut(data=items, count=len(items)).model_dump_json()
+
+    assert benchmark(serialize).startswith('{"data":[')
+
+
+@pytest.fixture(scope="module", params=[100, 1000])
+def page(request: pytest.FixtureRequest) -> list[Item]:
+    return [
+        Item(id=i, title=f"Item {i}", description="Description " * 5, owner_id=1)
+        for i in range(request.param)
+    ]
+
+
+@pytest.fixture(scope="module")
+def loop() -> Iterator[asyncio.AbstractEventLoop]:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_items_page_response_model(
+    benchmark: BenchmarkFixture,
+    page: list[Item],
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    # Reference for FastJSONResponse: FastAPI validates the returned model
+    # against the response_model again and encodes it with jsonable_encoder
+    route = next(
+        route
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.name == "read_items"
+    )
+
+    def respond() -> bytes:
+        content = ItemsOut(data=page, count=len(page))
+        serialized = loop.run_until_complete(
+            serialize_response(field=route.response_field, response_content=content)
+        )
+        return JSONResponse(serialized).body
+
+    assert benchmark(respond).startswith(b'{"data":[')
+
+
+def test_items_page_fast_response(
+    benchmark: BenchmarkFixture, page: list[Item]
+) -> None:
+    def respond() -> bytes:
+        return FastJSONResponse(ItemsOut(data=page, count=len(page))).body
+
+    assert benchmark(respond).startswith(b'{"data":[')
+
+
+@pytest.fixture(scope="module")
+def email_context() -> dict[str, Any]:
+    return {
+        "project_name": settings.PROJECT_NAME,
+        "username": "user@example.com",
+        "email": "user@example.com",
+        "valid_hours": settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS,
+        "link": f"{settings.server_host}/reset-password?token=token",
+    }
+
+
+def test_render_email_template(
+    benchmark: BenchmarkFixture, email_context: dict[str, Any]
+) -> None:
+    html = benchmark(
+        render_email_template,
+        template_name="reset_password.html",
+        context=email_context,
+    )
+    assert "user@example.com" in html
+
+
+def test_render_email_template_uncompiled(
+    benchmark: BenchmarkFixture, email_context: dict[str, Any]
+) -> None:
+    # Reference for render_email_template: read and compile on every call
+    path = Path(get_email_templates().loader.searchpath[0]) / "reset_password.html"  # type: ignore[union-attr]
+
+    def render() -> str:
+        html: str = Template(path.read_text()).render(email_context)
+        return html
+
+    assert "user@example.com" in benchmark(render)
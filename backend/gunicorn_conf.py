@@ -0,0 +1,23 @@
+import os
+import runpy
+import shutil
+
+# Only the gunicorn workers share their metrics through files, set before
+# prometheus_client is imported. Scripts, tests and one-off processes of the
+# image keep the default in-memory registry
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+
+# Keep the base image's settings and only add the metrics handling
+globals().update(runpy.run_path("/gunicorn_conf.py"))
+
+
+def on_starting(server):
+    # Drop metrics left over by the workers of a previous run
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)